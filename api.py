@@ -0,0 +1,303 @@
+# ----------------------------------------------------------------------------#
+# JSON API (v1).
+# ----------------------------------------------------------------------------#
+
+import json
+from datetime import date, datetime
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+from sqlalchemy import func
+from sqlalchemy.orm import raiseload
+from werkzeug.exceptions import HTTPException
+
+from forms import catalog_filters, facet_filters
+from models import (
+    db,
+    Artist,
+    Show,
+    Venue,
+    facet_counts,
+    filter_catalog,
+    search_keyset,
+    show_counts,
+)
+from pagination import keyset_page
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# rows fetched per round-trip when streaming a full export
+EXPORT_BATCH_SIZE = 1000
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """Encode `value` as UTF-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(value, status=200):
+    return Response(dumps(value), status=status, mimetype="application/json")
+
+
+def paged_response(page, serialize, **extra):
+    return json_response(
+        {
+            "data": [serialize(row) for row in page["items"]],
+            "next_cursor": page["next_cursor"],
+            "prev_cursor": page["prev_cursor"],
+            "next_url": page["next_url"],
+            "prev_url": page["prev_url"],
+            **extra,
+        }
+    )
+
+
+def stream_array(rows, serialize, chunk_size=EXPORT_BATCH_SIZE):
+    """Yield a JSON array in chunks of `chunk_size` encoded elements."""
+    yield b"["
+    chunk = []
+    separator = b""
+    for row in rows:
+        chunk.append(dumps(serialize(row)))
+        if len(chunk) == chunk_size:
+            yield separator + b",".join(chunk)
+            separator = b","
+            chunk = []
+    if chunk:
+        yield separator + b",".join(chunk)
+    yield b"]"
+
+
+# ----------------------------------------------------------------------------#
+# Serializers.
+# ----------------------------------------------------------------------------#
+
+SUMMARY_COLUMNS = ("id", "name", "city", "state", "upcoming_shows_count")
+
+
+def summary_json(row):
+    """Listing/search representation of a venue or artist row."""
+    return {column: getattr(row, column) for column in SUMMARY_COLUMNS}
+
+
+def venue_detail(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "updated_at": venue.updated_at,
+    }
+
+
+def artist_detail(artist):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "updated_at": artist.updated_at,
+    }
+
+
+def show_json(row):
+    return {
+        "id": row.id,
+        "start_time": row.start_time,
+        "end_time": row.end_time,
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+    }
+
+
+def shows_query():
+    return (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.end_time,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+    )
+
+
+def _summary_columns(model):
+    return tuple(getattr(model, column) for column in SUMMARY_COLUMNS)
+
+
+def _catalog_query(model):
+    try:
+        genres, state = catalog_filters(request.args)
+    except ValueError as error:
+        abort(400, str(error))
+    return filter_catalog(
+        db.session.query(*_summary_columns(model)), model, genres, state
+    )
+
+
+def _when_filter():
+    when = request.args.get("when", "upcoming")
+    if when == "upcoming":
+        return Show.start_time > func.now(), False
+    if when == "past":
+        return Show.start_time <= func.now(), True
+    abort(400, "'when' must be 'upcoming' or 'past'.")
+
+
+# ----------------------------------------------------------------------------#
+# Endpoints.
+# ----------------------------------------------------------------------------#
+
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response(
+        {"error": error.name, "message": error.description}, status=error.code
+    )
+
+
+@api.route("/venues")
+def venues():
+    page = keyset_page(_catalog_query(Venue), (Venue.name, Venue.id))
+    return paged_response(page, summary_json)
+
+
+@api.route("/venues/<int:venue_id>")
+def venue(venue_id):
+    venue = Venue.query.options(raiseload("*")).get_or_404(venue_id)
+    counts = show_counts(Show.venue_id, venue_id)
+    return json_response(dict(venue_detail(venue), **counts._asdict()))
+
+
+@api.route("/venues/<int:venue_id>/shows")
+def venue_shows(venue_id):
+    condition, descending = _when_filter()
+    page = keyset_page(
+        shows_query().filter(Show.venue_id == venue_id, condition),
+        (Show.start_time, Show.id),
+        descending=descending,
+    )
+    return paged_response(page, show_json)
+
+
+@api.route("/artists")
+def artists():
+    page = keyset_page(_catalog_query(Artist), (Artist.name, Artist.id))
+    return paged_response(page, summary_json)
+
+
+@api.route("/artists/<int:artist_id>")
+def artist(artist_id):
+    artist = Artist.query.options(raiseload("*")).get_or_404(artist_id)
+    counts = show_counts(Show.artist_id, artist_id)
+    return json_response(dict(artist_detail(artist), **counts._asdict()))
+
+
+@api.route("/artists/<int:artist_id>/shows")
+def artist_shows(artist_id):
+    condition, descending = _when_filter()
+    page = keyset_page(
+        shows_query().filter(Show.artist_id == artist_id, condition),
+        (Show.start_time, Show.id),
+        descending=descending,
+    )
+    return paged_response(page, show_json)
+
+
+@api.route("/shows")
+def shows():
+    page = keyset_page(shows_query(), (Show.start_time, Show.id))
+    return paged_response(page, show_json)
+
+
+@api.route("/shows/export")
+def export_shows():
+    """Every show as one JSON array, streamed from a server-side cursor so
+    neither the rows nor the encoded document are held in memory."""
+    rows = (
+        shows_query()
+        .order_by(Show.start_time, Show.id)
+        .execution_options(stream_results=True)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    return Response(
+        stream_with_context(stream_array(rows, show_json)),
+        mimetype="application/json",
+    )
+
+
+def facets_json(facets):
+    return {
+        "total": facets["total"],
+        "state": facets["state"],
+        "city": [
+            {"state": state, "city": city, "count": count}
+            for (state, city), count in facets["city"].items()
+        ],
+        "genre": facets["genre"],
+        "seeking": {
+            str(flag).lower(): count for flag, count in facets["seeking"].items()
+        },
+    }
+
+
+@api.route("/search")
+def search():
+    """Ranked matches of `q`, narrowed by the genre, state, city and seeking
+    arguments and paged like the listings; with facets=1 also the facet
+    counts of every match."""
+    search_type = request.args.get("type", "venues")
+    if search_type not in ("venues", "artists"):
+        abort(400, "'type' must be 'venues' or 'artists'.")
+    model = Venue if search_type == "venues" else Artist
+    try:
+        filters = facet_filters(request.args)
+    except ValueError as error:
+        abort(400, str(error))
+
+    search_term = request.args.get("q", "")
+    query, keyset, descending = search_keyset(
+        model, search_term, _summary_columns(model), **filters
+    )
+    page = keyset_page(query, keyset, descending=descending)
+    extra = {}
+    if request.args.get("facets") == "1":
+        extra["facets"] = facets_json(facet_counts(model, search_term, **filters))
+    return paged_response(page, summary_json, **extra)
@@ -3,8 +3,10 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import functools
 import dateutil.parser
 import babel
+import babel.dates
 from flask import (
     Flask,
     render_template,
@@ -14,21 +16,58 @@ from flask import (
     redirect,
     url_for,
     jsonify,
+    abort,
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy.exc import IntegrityError
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from models import db, Show, Venue, Artist
+from models import (
+    db,
+    Show,
+    Venue,
+    Artist,
+    release_venue_shows,
+    touch_show_partners,
+    guard_lazy_loads,
+    facet_counts,
+    filter_catalog,
+    search_query,
+    show_counts,
+)
+from sqlalchemy.orm import raiseload, selectinload
+from pagination import keyset_page
+from booking import (
+    Booking,
+    booking_namespaces,
+    check_bookings,
+    check_show_form,
+    insert_shows,
+    is_booking_conflict,
+    repeat_rrule,
+    report_problems,
+)
+import instrumentation
+import logs
+import metrics
+import pooling
+import routing
+from routing import read_only
+from cache import Cache
+from suggest import SuggestIndex
+from conditional import conditional_response, make_etag
+from api import api
+import commands
+import config
+import signing
 
 # from flask_wtf import csrf
 from flask_wtf.csrf import CSRFProtect
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -38,9 +77,21 @@ from datetime import datetime
 csrf = CSRFProtect()
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object("config")
+app.config.from_object(config.profile())
+logs.init_app(app)
+signing.init_app(app)
+pooling.init_app(app)
+routing.init_app(app)
 db.init_app(app)
+if app.config.get("SQLALCHEMY_RAISE_ON_LAZY_LOAD"):
+    guard_lazy_loads()
 csrf.init_app(app)
+instrumentation.init_app(app)
+metrics.init_app(app)
+commands.init_app(app)
+cache = Cache(app)
+suggestions = SuggestIndex(app)
+app.register_blueprint(api)
 migrate = Migrate(app, db)
 
 # DONE! connect to a local postgresql database
@@ -50,16 +101,284 @@ migrate = Migrate(app, db)
 # ----------------------------------------------------------------------------#
 
 
+DATETIME_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+DATETIME_LOCALE = babel.Locale.parse("en")
+
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format):
+    """Compiled Babel pattern for a named format or a raw CLDR pattern."""
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
 def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en")
+    # views pass datetime objects; strings are still accepted for old callers
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return datetime_pattern(format).apply(value, DATETIME_LOCALE)
 
 
 app.jinja_env.filters["datetime"] = format_datetime
+# for the genre/state filters of the listing pages
+app.jinja_env.globals.update(
+    genre_choices=genre_choices, state_choices=state_choices, known_genres=GENRES
+)
+
+# ----------------------------------------------------------------------------#
+# Caching.
+# ----------------------------------------------------------------------------#
+
+
+def render_cached(template, namespaces, build_context, key=None):
+    """Render `template` with view data cached per namespace and `key`
+    (the full path by default).
+
+    Only the query results are cached; the page itself is rendered per
+    request so CSRF tokens and flashed messages stay per-user.
+    """
+    context = cache.get_or_set(namespaces, key or request.full_path, build_context)
+    return render_template(template, **context)
+
+
+def listing_filters():
+    """(genres, state) filters of a venue/artist listing, 400 if unknown."""
+    try:
+        return catalog_filters(request.args)
+    except ValueError as error:
+        abort(400, str(error))
+
+
+def filters_key(etag, genres, state):
+    # cache key of a filtered listing page: the same rows can be a page of
+    # several listings, with different pager links
+    return f"{etag}:{','.join(genres)}:{state or ''}"
+
+
+def page_validators(query, columns):
+    """ETag and Last-Modified of one listing page, computed from the
+    (id, updated_at) of its rows with the listing's own keyset query."""
+    rows = keyset_page(query, columns)["items"]
+    last_modified = max((row.updated_at for row in rows), default=None)
+    return make_etag([(row.id, row.updated_at) for row in rows]), last_modified
+
+
+def detail_validators(model, foreign_key, entity_id):
+    """ETag and Last-Modified of a venue/artist page, 404 if it is missing.
+
+    The page changes when the row is updated or when one of its shows moves
+    from upcoming to past, so both are read in one indexed lookup.
+    """
+    last_past_show = (
+        db.select([func.max(Show.start_time)])
+        .where(foreign_key == model.id)
+        .where(Show.start_time <= func.now())
+        .as_scalar()
+    )
+    row = (
+        db.session.query(model.updated_at, last_past_show)
+        .filter(model.id == entity_id)
+        .first()
+    )
+    if row is None:
+        abort(404)
+    last_modified = max(value for value in row if value is not None)
+    return make_etag(last_modified), last_modified
+
+
+def venue_namespaces(venue_id):
+    """Cache namespaces holding data of a venue: the listings it appears in,
+    its own page and the pages of the artists playing there."""
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id)
+    return ["venues", "shows", f"venue:{venue_id}"] + [
+        f"artist:{artist_id}" for (artist_id,) in artist_ids.distinct()
+    ]
+
+
+def artist_namespaces(artist_id):
+    """Cache namespaces holding data of an artist: the listings it appears in,
+    its own page and the pages of the venues it plays at."""
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id)
+    return ["artists", "shows", f"artist:{artist_id}"] + [
+        f"venue:{venue_id}" for (venue_id,) in venue_ids.distinct()
+    ]
+
+
+@app.route("/stats/cache")
+def cache_stats():
+    return jsonify(dict(cache.stats, hit_ratio=cache.hit_ratio()))
+
+
+@app.route("/stats/pool")
+def pool_stats():
+    # per worker process: every worker has its own pools
+    stats = pooling.pool_stats(db.engine)
+    stats["replicas"] = {
+        bind: pooling.pool_stats(db.get_engine(app, bind=bind))
+        for bind in app.config["DATABASE_REPLICAS"]
+    }
+    return jsonify(stats)
+
+
+# ----------------------------------------------------------------------------#
+# Faceted search.
+# ----------------------------------------------------------------------------#
+
+SEEKING_LABELS = {
+    Venue: {True: "Seeking talent", False: "Not seeking talent"},
+    Artist: {True: "Seeking a venue", False: "Not seeking a venue"},
+}
+
+
+def cached_facet_counts(model, search_term, filters):
+    """facet_counts() of a search, cached for browsing (no search term) and
+    short terms, the searches most users repeat and the most expensive to
+    count; other searches count on every request.
+
+    Entries live in the "venues"/"artists" namespace, so every write to a
+    venue/artist invalidates them.
+    """
+
+    def count():
+        return facet_counts(model, search_term, **filters)
+
+    normalized = search_term.strip().lower()
+    if len(normalized) > app.config["SEARCH_FACETS_CACHE_MAX_TERM"]:
+        return count()
+    key = "facets:" + json.dumps([normalized, filters], sort_keys=True)
+    return cache.get_or_set([f"{model.__tablename__}s"], key, count)
+
+
+def search_url(search_term, filters, **changes):
+    """GET URL of the current search with `changes` to its filters; facet
+    links are plain links so the narrowed searches can be bookmarked."""
+    filters = dict(filters, **changes)
+    args = {"search_term": search_term} if search_term else {}
+    if filters["genres"]:
+        args["genre"] = filters["genres"]
+    for name in ("state", "city"):
+        if filters[name]:
+            args[name] = filters[name]
+    if filters["seeking"] is not None:
+        args["seeking"] = int(filters["seeking"])
+    return url_for(request.endpoint, **args)
+
+
+def facet_links(model, facets, search_term, filters):
+    """Template data of the facets: the most frequent values of each facet
+    not fixed yet, linking to the narrowed search, and the active filters,
+    linking to the search without them."""
+    limit = app.config["SEARCH_FACET_LIMIT"]
+
+    def top(counts, label, changes):
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+        return [
+            {
+                "label": label(value),
+                "count": count,
+                "url": search_url(search_term, filters, **changes(value)),
+            }
+            for value, count in ranked[:limit]
+        ]
+
+    links = {}
+    if not filters["state"]:
+        links["State"] = top(facets["state"], str, lambda state: {"state": state})
+    if not filters["city"]:
+        links["City"] = top(
+            facets["city"],
+            lambda place: f"{place[1]}, {place[0]}",
+            lambda place: {"state": place[0], "city": place[1]},
+        )
+    genres = {
+        genre: count
+        for genre, count in facets["genre"].items()
+        if genre not in filters["genres"]
+    }
+    links["Genre"] = top(
+        genres, str, lambda genre: {"genres": sorted(filters["genres"] + [genre])}
+    )
+    if filters["seeking"] is None:
+        links["Seeking"] = top(
+            facets["seeking"], SEEKING_LABELS[model].get, lambda flag: {"seeking": flag}
+        )
+
+    active = [
+        {
+            "label": genre,
+            "url": search_url(
+                search_term,
+                filters,
+                genres=[other for other in filters["genres"] if other != genre],
+            ),
+        }
+        for genre in filters["genres"]
+    ]
+    if filters["state"]:
+        active.append(
+            {
+                "label": filters["state"],
+                "url": search_url(search_term, filters, state=None, city=None),
+            }
+        )
+    if filters["city"]:
+        active.append(
+            {
+                "label": filters["city"],
+                "url": search_url(search_term, filters, city=None),
+            }
+        )
+    if filters["seeking"] is not None:
+        active.append(
+            {
+                "label": SEEKING_LABELS[model][filters["seeking"]],
+                "url": search_url(search_term, filters, seeking=None),
+            }
+        )
+    return {
+        "facets": {name: values for name, values in links.items() if values},
+        "active": active,
+    }
+
+
+def search_context(model):
+    """Results and facet counts of a venue/artist search, from the navbar
+    form (POST) or a facet link (GET)."""
+    search_term = request.values.get("search_term", "")
+    try:
+        filters = facet_filters(request.values)
+    except ValueError as error:
+        abort(400, str(error))
+
+    search_results = search_query(
+        model,
+        search_term,
+        (model.id, model.name, model.upcoming_shows_count.label("num_upcoming_shows")),
+        app.config["SEARCH_RESULT_LIMIT"],
+        **filters,
+    ).all()
+    facets = cached_facet_counts(model, search_term, filters)
+
+    response = {
+        # every match; the list itself stops at SEARCH_RESULT_LIMIT
+        "count": facets["total"],
+        "data": [
+            {
+                "id": result.id,
+                "name": result.name,
+                "num_upcoming_shows": result.num_upcoming_shows,
+            }
+            for result in search_results
+        ],
+    }
+    return dict(
+        facet_links(model, facets, search_term, filters),
+        results=response,
+        search_term=search_term,
+    )
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
@@ -76,125 +395,152 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues")
-def venues():
-    # DONE!: replace with real venues data.
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-
-    data = []
-
-    venues_shows = (
-        db.session.query(
-            Venue.city,
-            Venue.state,
-            Venue.id,
-            Venue.name,
-            func.count(Show.id).label("num_upcoming_shows"),
-        )
-        .outerjoin(Show)
-        # .filter(Show.start_time > datetime.now())
-        .group_by(Venue.city, Venue.state, Venue.id, Venue.name)
-        .order_by("num_upcoming_shows", Venue.city, Venue.state, Venue.id, Venue.name)
-        .all()
+def venues_context(genres=(), state=None):
+    page = keyset_page(
+        filter_catalog(
+            db.session.query(
+                Venue.id,
+                Venue.name,
+                Venue.city,
+                Venue.state,
+                Venue.upcoming_shows_count,
+            ),
+            Venue,
+            genres,
+            state,
+        ),
+        (Venue.name, Venue.id),
     )
 
-    # if len(venues_upcoming_shows) > 0:
-    city = venues_shows[0].city
-    state = venues_shows[0].state
-    venues = []
-    for venue in venues_shows:
-        if city != venue.city or state != venue.state:
-            data.append({"city": city, "state": state, "venues": venues})
-            city = venue.city
-            state = venue.state
-            venues = []
-        venues.append(
+    areas = {}
+    for venue in page["items"]:
+        area = areas.setdefault(
+            (venue.state, venue.city),
+            {"city": venue.city, "state": venue.state, "venues": []},
+        )
+        area["venues"].append(
             {
                 "id": venue.id,
                 "name": venue.name,
-                "num_upcoming_shows": venue.num_upcoming_shows,
+                "num_upcoming_shows": venue.upcoming_shows_count,
             }
         )
-    data.append({"city": city, "state": state, "venues": venues})
+    data = [areas[key] for key in sorted(areas)]
+
+    return {
+        "areas": data,
+        "page": page,
+        "filters": {"genres": list(genres), "state": state},
+    }
 
-    return render_template("pages/venues.html", areas=data)
 
+@app.route("/venues")
+def venues():
+    # DONE!: replace with real venues data.
+    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
 
-@app.route("/venues/search", methods=["POST"])
+    genres, state = listing_filters()
+    etag, last_modified = page_validators(
+        filter_catalog(
+            db.session.query(Venue.id, Venue.name, Venue.updated_at),
+            Venue,
+            genres,
+            state,
+        ),
+        (Venue.name, Venue.id),
+    )
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: render_cached(
+            "pages/venues.html",
+            ["venues"],
+            lambda: venues_context(genres, state),
+            key=filters_key(etag, genres, state),
+        ),
+    )
+
+
+@app.route("/search/suggest")
+def search_suggest():
+    """Typeahead matches for `q` over venue and artist names and places,
+    answered from the in-process index without a database query."""
+    kind = request.args.get("type")
+    if kind not in (None, "venue", "artist"):
+        abort(400)
+    limit = min(
+        request.args.get("limit", app.config["SUGGEST_LIMIT"], type=int),
+        app.config["SUGGEST_MAX_LIMIT"],
+    )
+    results = suggestions.suggest(request.args.get("q", ""), kind, max(limit, 1))
+    for result in results:
+        if result["type"] == "venue":
+            result["url"] = url_for("show_venue", venue_id=result["id"])
+        else:
+            result["url"] = url_for("show_artist", artist_id=result["id"])
+    return jsonify({"count": len(results), "data": results})
+
+
+@app.route("/venues/search", methods=["GET", "POST"])
+@read_only
 def search_venues():
     # DONE!: implement search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    search_term = request.form.get("search_term", "")
+    return render_template("pages/search_venues.html", **search_context(Venue))
 
-    search_results = (
-        db.session.query(
-            Venue.city,
-            Venue.name,
-            Venue.id,
-            func.count(Show.id).label("num_upcoming_shows"),
-        )
-        .filter(Venue.name.ilike(f"%{search_term}%"))
-        .group_by(Venue.city, Venue.state, Venue.id, Venue.name)
-        .order_by("num_upcoming_shows", Venue.city, Venue.state, Venue.id, Venue.name)
-        .all()
-    )
 
-    data = []
-    for venue in search_results:
-        data.append(
-            {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": venue.num_upcoming_shows,
-            }
-        )
+def show_pages(shows_query):
+    """Split `shows_query` into bounded upcoming and past pages in SQL.
 
-    response = {
-        "count": len(search_results),
-        "data": data,
-    }
-    return render_template(
-        "pages/search_venues.html",
-        results=response,
-        search_term=request.form.get("search_term", ""),
+    Upcoming shows run soonest first and past shows most recent first; each
+    list pages independently through the upcoming_/past_ cursor arguments.
+    """
+    per_page = app.config["DETAIL_SHOWS_PAGE_SIZE"]
+    upcoming_page = keyset_page(
+        shows_query.filter(Show.start_time > func.now()),
+        (Show.start_time, Show.id),
+        per_page=per_page,
+        arg_prefix="upcoming_",
     )
+    past_page = keyset_page(
+        shows_query.filter(Show.start_time <= func.now()),
+        (Show.start_time, Show.id),
+        descending=True,
+        per_page=per_page,
+        arg_prefix="past_",
+    )
+    return upcoming_page, past_page
 
 
-@app.route("/venues/<int:venue_id>")
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # DONE!: replace with real venue data from the venues table, using venue_id
-
-    data = {}
-    past_shows = []
-    upcoming_shows = []
-
-    venue = Venue.query.get_or_404(venue_id)
-    venue_shows = (
+def venue_context(venue_id):
+    venue = Venue.query.options(raiseload("*")).get_or_404(venue_id)
+    counts = show_counts(Show.venue_id, venue_id)
+    upcoming_page, past_page = show_pages(
         db.session.query(
+            Show.id,
+            Show.start_time,
             Artist.id.label("artist_id"),
             Artist.name.label("artist_name"),
             Artist.image_link.label("artist_image_link"),
-            Show.start_time.label("start_time"),
         )
-        .join(Artist)
-        .join(Venue)
-        .filter(Venue.id == venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .filter(Show.venue_id == venue_id)
     )
 
-    for show in venue_shows:
-        show_data = {
-            "artist_id": show.artist_id,
-            "artist_name": show.artist_name,
-            "artist_image_link": show.artist_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        if show.start_time <= datetime.now():
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
+    past_shows, upcoming_shows = [
+        [
+            {
+                "artist_id": show.artist_id,
+                "artist_name": show.artist_name,
+                "artist_image_link": show.artist_image_link,
+                "start_time": show.start_time,
+            }
+            for show in page["items"]
+        ]
+        for page in (past_page, upcoming_page)
+    ]
 
     data = {
         "id": venue.id,
@@ -211,10 +557,29 @@ def show_venue(venue_id):
         "image_link": venue.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows_count": counts.past_shows_count,
+        "archived_shows_count": counts.archived_shows_count,
+        "upcoming_shows_count": counts.upcoming_shows_count,
     }
-    return render_template("pages/show_venue.html", venue=data)
+    return {"venue": data, "past_page": past_page, "upcoming_page": upcoming_page}
+
+
+@app.route("/venues/<int:venue_id>")
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # DONE!: replace with real venue data from the venues table, using venue_id
+
+    etag, last_modified = detail_validators(Venue, Show.venue_id, venue_id)
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: render_cached(
+            "pages/show_venue.html",
+            [f"venue:{venue_id}"],
+            lambda: venue_context(venue_id),
+            key=etag,
+        ),
+    )
 
 
 #  Create Venue
@@ -242,7 +607,6 @@ def create_venue_submission():
         return render_template("forms/new_venue.html", form=form)
 
     try:
-        print(request.form)
         new_venue = Venue(
             name=form.name.data,
             city=form.city.data,
@@ -266,16 +630,20 @@ def create_venue_submission():
 
         db.session.add(new_venue)
         db.session.commit()
+        cache.invalidate("venues")
+        suggestions.update(
+            "venue", new_venue.id, new_venue.name, new_venue.city, new_venue.state
+        )
 
         # on successful db insert, flash success
         flash("Venue " + request.form["name"] + " was successfully listed!")
 
-    except Exception as e:
+    except Exception:
         db.session.rollback()
         flash(
             "An error occurred. Venue " + request.form["name"] + " could not be listed."
         )
-        print(e)
+        app.logger.exception("Venue could not be listed")
     # DONE!: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
@@ -291,13 +659,18 @@ def delete_venue(venue_id):
     # clicking that button delete it from the db then redirect the user to the homepage
 
     try:
-        venue = Venue.query.get_or_404(venue_id)
+        # the delete cascade needs the shows: load them in one extra query
+        venue = Venue.query.options(selectinload(Venue.shows)).get_or_404(venue_id)
+        namespaces = venue_namespaces(venue_id)
+        release_venue_shows(venue_id)
         db.session.delete(venue)
         db.session.commit()
+        cache.invalidate(*namespaces)
+        suggestions.remove("venue", venue_id)
         flash(f"Venue {venue_id} was successfully deleted!")
         return jsonify({"redirect": url_for("index")})
     except Exception as e:
-        print(e)
+        app.logger.exception("Venue %s could not be deleted", venue_id)
         db.session.rollback()
         flash(f"An error occurred. Venue {venue_id} could not be deleted.")
         # return render_template("pages/show_venue.html", venue=venue_id)
@@ -306,96 +679,90 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route("/artists")
-def artists():
-    # DONE!: replace with real data returned from querying the database
+def artists_context(genres=(), state=None):
+    page = keyset_page(
+        filter_catalog(db.session.query(Artist.id, Artist.name), Artist, genres, state),
+        (Artist.name, Artist.id),
+    )
 
-    data = []
+    data = [
+        {
+            "id": artist.id,
+            "name": artist.name,
+        }
+        for artist in page["items"]
+    ]
 
-    artists = Artist.query.all()
+    return {
+        "artists": data,
+        "page": page,
+        "filters": {"genres": list(genres), "state": state},
+    }
 
-    if artists:
-        data = [
-            {
-                "id": artist.id,
-                "name": artist.name,
-            }
-            for artist in artists
-        ]
 
-    return render_template("pages/artists.html", artists=data)
+@app.route("/artists")
+def artists():
+    # DONE!: replace with real data returned from querying the database
+
+    genres, state = listing_filters()
+    etag, last_modified = page_validators(
+        filter_catalog(
+            db.session.query(Artist.id, Artist.name, Artist.updated_at),
+            Artist,
+            genres,
+            state,
+        ),
+        (Artist.name, Artist.id),
+    )
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: render_cached(
+            "pages/artists.html",
+            ["artists"],
+            lambda: artists_context(genres, state),
+            key=filters_key(etag, genres, state),
+        ),
+    )
 
 
-@app.route("/artists/search", methods=["POST"])
+@app.route("/artists/search", methods=["GET", "POST"])
+@read_only
 def search_artists():
     # DONE!: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
 
-    search_terms = request.form.get("search_term", "")
-    search_results = (
-        db.session.query(
-            Artist.id, Artist.name, func.count(Show.id).label("num_upcoming_shows")
-        )
-        .filter(Artist.name.ilike(f"%{search_terms}%"))
-        .group_by(Artist.id, Artist.name)
-        .order_by(Artist.id, Artist.name)
-        .all()
-    )
-
-    response = {
-        "count": len(search_results),
-        "data": [
-            {
-                "id": result.id,
-                "name": result.name,
-                "num_upcoming_shows": result.num_upcoming_shows,
-            }
-            for result in search_results
-        ],
-    }
-
-    return render_template(
-        "pages/search_artists.html",
-        results=response,
-        search_term=request.form.get("search_term", ""),
-    )
+    return render_template("pages/search_artists.html", **search_context(Artist))
 
 
-@app.route("/artists/<int:artist_id>")
-def show_artist(artist_id):
-    # shows the artist page with the given artist_id
-    # DONE!: replace with real artist data from the artist table, using artist_id
-
-    data = {}
-    past_shows = []
-    upcoming_shows = []
-
-    artist = Artist.query.get_or_404(artist_id)
-
-    artist_shows = (
+def artist_context(artist_id):
+    artist = Artist.query.options(raiseload("*")).get_or_404(artist_id)
+    counts = show_counts(Show.artist_id, artist_id)
+    upcoming_page, past_page = show_pages(
         db.session.query(
+            Show.id,
+            Show.start_time,
             Venue.id.label("venue_id"),
             Venue.name.label("venue_name"),
             Venue.image_link.label("venue_image_link"),
-            Show.start_time.label("start_time"),
         )
-        .join(Artist)
-        .join(Venue)
-        .filter(Artist.id == artist_id)
+        .join(Venue, Venue.id == Show.venue_id)
+        .filter(Show.artist_id == artist_id)
     )
 
-    for show in artist_shows:
-        show_data = {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue_name,
-            "venue_image_link": show.venue_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        if show.start_time <= datetime.now():
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
+    past_shows, upcoming_shows = [
+        [
+            {
+                "venue_id": show.venue_id,
+                "venue_name": show.venue_name,
+                "venue_image_link": show.venue_image_link,
+                "start_time": show.start_time,
+            }
+            for show in page["items"]
+        ]
+        for page in (past_page, upcoming_page)
+    ]
 
     data = {
         "id": artist.id,
@@ -410,11 +777,30 @@ def show_artist(artist_id):
         "seeking_description": artist.seeking_description,
         "image_link": artist.image_link,
         "past_shows": past_shows,
-        "past_shows_count": len(past_shows),
+        "past_shows_count": counts.past_shows_count,
+        "archived_shows_count": counts.archived_shows_count,
         "upcoming_shows": upcoming_shows,
-        "upcoming_shows_count": len(upcoming_shows),
+        "upcoming_shows_count": counts.upcoming_shows_count,
     }
-    return render_template("pages/show_artist.html", artist=data)
+    return {"artist": data, "past_page": past_page, "upcoming_page": upcoming_page}
+
+
+@app.route("/artists/<int:artist_id>")
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # DONE!: replace with real artist data from the artist table, using artist_id
+
+    etag, last_modified = detail_validators(Artist, Show.artist_id, artist_id)
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: render_cached(
+            "pages/show_artist.html",
+            [f"artist:{artist_id}"],
+            lambda: artist_context(artist_id),
+            key=etag,
+        ),
+    )
 
 
 #  Update
@@ -424,7 +810,7 @@ def edit_artist(artist_id):
     form = ArtistForm()
     # DONE!: populate form with fields from artist with ID <artist_id>
 
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.options(raiseload("*")).get_or_404(artist_id)
     if artist:
         form.name.data = artist.name
         form.genres.data = artist.genres
@@ -446,7 +832,7 @@ def edit_artist_submission(artist_id):
     # artist record with ID <artist_id> using the new attributes
 
     form = ArtistForm(request.form)
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.options(raiseload("*")).get_or_404(artist_id)
 
     if not form.validate():
         message = []
@@ -467,17 +853,22 @@ def edit_artist_submission(artist_id):
             artist.seeking_venue = form.seeking_venue.data
             artist.seeking_description = form.seeking_description.data
             artist.genres = form.genres.data
+            touch_show_partners(Artist, artist_id)
 
             db.session.commit()
+            cache.invalidate(*artist_namespaces(artist_id))
+            suggestions.update(
+                "artist", artist_id, form.name.data, form.city.data, form.state.data
+            )
             flash("Artist " + request.form["name"] + " was successfully updated!")
-        except Exception as e:
+        except Exception:
             db.session.rollback()
             flash(
                 "An error occurred. Artist "
                 + request.form["name"]
                 + " could not be updated."
             )
-            print(e)
+            app.logger.exception("Artist %s could not be updated", artist_id)
 
     return redirect(url_for("show_artist", artist_id=artist_id))
 
@@ -487,7 +878,7 @@ def edit_venue(venue_id):
     form = VenueForm()
     # DONE!: populate form with values from venue with ID <venue_id>
 
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.options(raiseload("*")).get_or_404(venue_id)
 
     if venue:
         form.name.data = venue.name
@@ -511,7 +902,7 @@ def edit_venue_submission(venue_id):
     # venue record with ID <venue_id> using the new attributes
 
     form = VenueForm(request.form)
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.options(raiseload("*")).get_or_404(venue_id)
 
     if not form.validate():
         message = []
@@ -533,17 +924,22 @@ def edit_venue_submission(venue_id):
             venue.seeking_description = form.seeking_description.data
 
             venue.genres = form.genres.data
+            touch_show_partners(Venue, venue_id)
 
             db.session.commit()
+            cache.invalidate(*venue_namespaces(venue_id))
+            suggestions.update(
+                "venue", venue_id, form.name.data, form.city.data, form.state.data
+            )
             flash("Venue " + request.form["name"] + " was successfully updated!")
-        except Exception as e:
+        except Exception:
             db.session.rollback()
             flash(
                 "An error occurred. Venue "
                 + request.form["name"]
                 + " could not be updated."
             )
-            print(e)
+            app.logger.exception("Venue %s could not be updated", venue_id)
 
     return redirect(url_for("show_venue", venue_id=venue_id))
 
@@ -590,15 +986,19 @@ def create_artist_submission():
 
         db.session.add(new_artist)
         db.session.commit()
+        cache.invalidate("artists")
+        suggestions.update(
+            "artist", new_artist.id, new_artist.name, new_artist.city, new_artist.state
+        )
 
         # on successful db insert, flash success
         flash("Artist " + new_artist.name + " was successfully listed!")
-    except Exception as e:
+    except Exception:
         # DONE!: on unsuccessful db insert, flash an error instead.
         # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
         db.session.rollback()
         flash("An error occurred. Artist " + form.name.data + " could not be listed.")
-        print(e)
+        app.logger.exception("Artist could not be listed")
 
     return render_template("pages/home.html")
 
@@ -607,31 +1007,63 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route("/shows")
-def shows():
-    # displays list of shows at /shows
-    # DONE!: replace with real venues data.
-
-    shows = Show.query.order_by(Show.start_time).all()
+def shows_context():
+    # one projected join per page: no ORM instances, no per-row lazy loads
+    shows_query = (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+    )
+    page = keyset_page(shows_query, (Show.start_time, Show.id))
     shows_data = [
         {
             "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
+            "venue_name": show.venue_name,
             "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": show.start_time,
         }
-        for show in shows
+        for show in page["items"]
     ]
 
-    return render_template("pages/shows.html", shows=shows_data)
+    return {"shows": shows_data, "page": page}
+
+
+@app.route("/shows")
+def shows():
+    # displays list of shows at /shows
+    # DONE!: replace with real venues data.
+
+    etag, last_modified = page_validators(
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            func.greatest(Venue.updated_at, Artist.updated_at).label("updated_at"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id),
+        (Show.start_time, Show.id),
+    )
+    return conditional_response(
+        etag,
+        last_modified,
+        lambda: render_cached("pages/shows.html", ["shows"], shows_context, key=etag),
+    )
 
 
 @app.route("/shows/create")
 def create_shows():
     # renders form. do not touch.
-    form = ShowForm()
+    form = ShowForm(duration=app.config["SHOW_DEFAULT_DURATION_MINUTES"])
     return render_template("forms/new_show.html", form=form)
 
 
@@ -642,37 +1074,128 @@ def create_show_submission():
 
     form = ShowForm(request.form)
 
-    if not form.validate():
+    bookings = check_show_form(form) if form.validate() else None
+    if bookings is None:
         message = []
         for field, errors in form.errors.items():
             message.append(field + ": " + ", ".join(errors))
         flash("Please fix the following errors: " + ", ".join(message))
-        form = ShowForm()
         return render_template("forms/new_show.html", form=form)
 
     try:
-        new_show = Show(
-            venue_id=form.venue_id.data,
-            artist_id=form.artist_id.data,
-            start_time=form.start_time.data,
-        )
-
-        db.session.add(new_show)
+        # repetitions are written together: one INSERT, one transaction
+        insert_shows(bookings)
         db.session.commit()
+        cache.invalidate(*booking_namespaces(bookings))
 
         # on successful db insert, flash success
-        flash("Show was successfully listed!")
+        if len(bookings) == 1:
+            flash("Show was successfully listed!")
+        else:
+            flash(f"{len(bookings)} shows were successfully listed!")
     except Exception as e:
         # TODO: on unsuccessful db insert, flash an error instead.
         # e.g., flash('An error occurred. Show could not be listed.')
         # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
         db.session.rollback()
+        if isinstance(e, IntegrityError) and is_booking_conflict(e):
+            # booked by a concurrent request since check_show_form()
+            report_problems(form, bookings, check_bookings(bookings))
+            flash("The show could not be listed: it overlaps another booking.")
+            return render_template("forms/new_show.html", form=form)
         flash("An error occurred. Show could not be listed.")
-        print(e)
+        app.logger.exception("Show could not be listed")
 
     return render_template("pages/home.html")
 
 
+def _iso_time(value):
+    # show times are stored without a zone, like the bulk import an offset
+    # is dropped rather than converted
+    return dateutil.parser.isoparse(value).replace(tzinfo=None)
+
+
+def _batch_bookings(entries):
+    """Bookings for the entries of a /shows/batch request, and for every
+    booking the index of the entry it came from. Raises ValueError with a
+    readable message on malformed entries."""
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("'shows' must be a non-empty list.")
+    bookings, sources = [], []
+    for index, entry in enumerate(entries):
+        try:
+            start_time = _iso_time(entry["start_time"])
+            if entry.get("end_time"):
+                end_time = _iso_time(entry["end_time"])
+            else:
+                duration = (
+                    entry.get("duration") or app.config["SHOW_DEFAULT_DURATION_MINUTES"]
+                )
+                end_time = start_time + timedelta(minutes=int(duration))
+            booking = Booking(
+                int(entry["venue_id"]), int(entry["artist_id"]), start_time, end_time
+            )
+            repeated = (
+                repeat_rrule(booking, entry["rrule"])
+                if entry.get("rrule")
+                else [booking]
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"shows[{index}]: {error}")
+        bookings.extend(repeated)
+        sources.extend([index] * len(repeated))
+        if len(bookings) > app.config["SHOW_BATCH_LIMIT"]:
+            raise ValueError(
+                f"At most {app.config['SHOW_BATCH_LIMIT']} shows can be created at once."
+            )
+    return bookings, sources
+
+
+@app.route("/shows/batch", methods=["POST"])
+def create_shows_batch():
+    """Create many shows, and repeating shows, in one transaction.
+
+    The JSON body is {"shows": [...]}, each entry with venue_id, artist_id,
+    start_time (ISO 8601), end_time or duration (minutes) and optionally an
+    RRULE, e.g. "FREQ=WEEKLY;BYDAY=FR;COUNT=52". Either every show is
+    created (201, with the new ids) or none is (422, with every problem).
+    Like the forms, the request needs the CSRF token, in X-CSRFToken.
+    """
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError('The body must be a JSON object: {"shows": [...]}.')
+        bookings, sources = _batch_bookings(body.get("shows"))
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    problems = check_bookings(bookings)
+    if not problems:
+        try:
+            show_ids = insert_shows(bookings)
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            if not is_booking_conflict(error):
+                raise
+            # lost a race with a concurrent booking: report what it took
+            problems = check_bookings(bookings)
+        else:
+            cache.invalidate(*booking_namespaces(bookings))
+            return jsonify({"count": len(show_ids), "show_ids": show_ids}), 201
+
+    errors = [
+        {
+            "index": sources[problem.index],
+            "start_time": bookings[problem.index].start_time.isoformat(),
+            "field": problem.field,
+            "message": problem.message,
+        }
+        for problem in problems
+    ]
+    return jsonify({"errors": errors}), 422
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
@@ -683,16 +1206,6 @@ def server_error(error):
     return render_template("errors/500.html"), 500
 
 
-if not app.debug:
-    file_handler = FileHandler("error.log")
-    file_handler.setFormatter(
-        Formatter("%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]")
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info("errors")
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
@@ -0,0 +1,48 @@
+"""Per-call cost of the `datetime` Jinja filter.
+
+    python -m benchmarks.bench_datetime_filter
+
+Compares the original filter (strftime'd string re-parsed by dateutil,
+pattern and locale resolved on every call) with app.format_datetime
+(datetime in, cached compiled pattern and locale).
+"""
+
+import timeit
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+from app import format_datetime
+
+
+def format_datetime_original(value, format="medium"):
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale="en")
+
+
+def main(number=20000):
+    start_time = datetime(2035, 4, 1, 20, 0)
+    as_string = start_time.strftime("%Y-%m-%d %H:%M:%S")
+    assert format_datetime_original(as_string, "full") == format_datetime(
+        start_time, "full"
+    )
+
+    cases = [
+        ("original (str)", lambda: format_datetime_original(as_string, "full")),
+        ("cached (datetime)", lambda: format_datetime(start_time, "full")),
+    ]
+    results = {}
+    for name, call in cases:
+        seconds = min(timeit.repeat(call, number=number, repeat=5))
+        results[name] = seconds / number * 1e6
+        print(f"{name:<20} {results[name]:8.2f} us/call")
+    print(f"speedup: {results['original (str)'] / results['cached (datetime)']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
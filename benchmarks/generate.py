@@ -0,0 +1,151 @@
+"""Deterministic synthetic catalog for benchmarking.
+
+    python -m benchmarks.generate --venues 1000 --artists 5000 --shows 100000 out/
+
+writes venues.jsonl, artists.jsonl and shows.jsonl in the format read by
+`flask import-catalog`. The same arguments and --seed always produce the
+same catalog; show start times are laid out relative to the day the files
+are generated, so the past/upcoming split stays the same over time.
+
+Each venue hosts at most one show per day (at 20:00) and the artist of
+venue v on day d is (v + d * stride) mod artists, so as long as there are
+at least as many artists as venues no venue or artist is double-booked.
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, time, timedelta
+
+from forms import genre_choices
+
+
+# (city, state, weight)
+CITIES = [
+    ("New York", "NY", 30),
+    ("Los Angeles", "CA", 20),
+    ("San Francisco", "CA", 12),
+    ("Chicago", "IL", 12),
+    ("Austin", "TX", 8),
+    ("Nashville", "TN", 8),
+    ("Seattle", "WA", 6),
+    ("New Orleans", "LA", 5),
+    ("Denver", "CO", 4),
+    ("Portland", "OR", 3),
+    ("Boston", "MA", 3),
+    ("Miami", "FL", 2),
+]
+
+WORDS = (
+    "Blue Velvet Electric Golden Wild Silent Neon Midnight "
+    "Crimson Hollow Iron Lunar Paper Rolling Saint Static"
+).split()
+VENUE_NOUNS = ["Hall", "Room", "Lounge", "Club", "Theatre", "Bar", "Garden", "Stage"]
+ARTIST_NOUNS = "Band Trio Collective Quartet Orchestra Project Sound".split()
+
+GENRES = [genre for genre, _ in genre_choices]
+
+
+def _weighted_genres(rng, genre_skew):
+    # Zipf-like popularity: the first genres in genre_choices are the most common
+    weights = [1 / (rank + 1) ** genre_skew for rank in range(len(GENRES))]
+    count = rng.choice((1, 1, 2, 3))
+    return sorted(set(rng.choices(GENRES, weights=weights, k=count)))
+
+
+def _city(rng, cities):
+    city, state, _ = rng.choices(cities, weights=[weight for *_, weight in cities])[0]
+    return city, state
+
+
+def _phone(rng):
+    return f"{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+
+
+def venues(count, rng, cities=CITIES, genre_skew=1.0):
+    for venue_id in range(1, count + 1):
+        city, state = _city(rng, cities)
+        yield {
+            "id": venue_id,
+            "name": f"The {rng.choice(WORDS)} {rng.choice(VENUE_NOUNS)} {venue_id}",
+            "city": city,
+            "state": state,
+            "address": f"{rng.randint(1, 9999)} {rng.choice(WORDS)} St",
+            "phone": _phone(rng),
+            "seeking_talent": rng.random() < 0.3,
+            "seeking_description": None,
+            "genres": _weighted_genres(rng, genre_skew),
+        }
+
+
+def artists(count, rng, cities=CITIES, genre_skew=1.0):
+    for artist_id in range(1, count + 1):
+        city, state = _city(rng, cities)
+        yield {
+            "id": artist_id,
+            "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(ARTIST_NOUNS)} {artist_id}",
+            "city": city,
+            "state": state,
+            "phone": _phone(rng),
+            "seeking_venue": rng.random() < 0.4,
+            "seeking_description": None,
+            "genres": _weighted_genres(rng, genre_skew),
+        }
+
+
+def shows(count, num_venues, num_artists, past_fraction=0.75, today=None):
+    if num_artists < num_venues:
+        raise ValueError("need at least as many artists as venues")
+    days = -(-count // num_venues)
+    today = today or datetime.now().date()
+    first_day = today - timedelta(days=int(days * past_fraction))
+    stride = 7 if num_artists % 7 else 11
+    for index in range(count):
+        day, venue_index = divmod(index, num_venues)
+        yield {
+            "id": index + 1,
+            "venue_id": venue_index + 1,
+            "artist_id": (venue_index + day * stride) % num_artists + 1,
+            "start_time": datetime.combine(
+                first_day + timedelta(days=day), time(20, 0)
+            ).isoformat(),
+        }
+
+
+def write_dataset(out_dir, num_venues, num_artists, num_shows, seed=1, genre_skew=1.0):
+    """Write the three JSONL files into `out_dir` and return their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    datasets = {
+        "venues": venues(num_venues, rng, genre_skew=genre_skew),
+        "artists": artists(num_artists, rng, genre_skew=genre_skew),
+        "shows": shows(num_shows, num_venues, num_artists),
+    }
+    paths = {}
+    for kind, records in datasets.items():
+        paths[kind] = os.path.join(out_dir, f"{kind}.jsonl")
+        with open(paths[kind], "w", encoding="utf-8") as target:
+            for record in records:
+                target.write(json.dumps(record) + "\n")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--venues", type=int, default=1000)
+    parser.add_argument("--artists", type=int, default=5000)
+    parser.add_argument("--shows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--genre-skew", type=float, default=1.0)
+    args = parser.parse_args()
+    paths = write_dataset(
+        args.out_dir, args.venues, args.artists, args.shows, args.seed, args.genre_skew
+    )
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Route benchmark suite.
+
+    BENCHMARK_DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python -m benchmarks.run --scale 10k --scale 100k --scale 1m
+
+For every scale the benchmark database is emptied, filled with the
+synthetic catalog from benchmarks.generate (through the COPY import) and
+every route is driven through the Flask test client. Latency percentiles,
+queries per request (from the Server-Timing header) and peak Python memory
+per request are recorded and compared against benchmarks/baseline.json;
+the run exits non-zero on a regression. A scale or route the baseline has
+no numbers for is reported, and fails the run only with --strict (as in
+CI, once a baseline is committed). Use --update-baseline to record or
+accept the current numbers.
+
+The database named by BENCHMARK_DATABASE_URL is wiped, never point it at
+real data.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generate import write_dataset
+
+# shows, venues, artists
+SCALES = {
+    "10k": (10_000, 100, 500),
+    "100k": (100_000, 1_000, 5_000),
+    "1m": (1_000_000, 5_000, 25_000),
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+QUERIES_PATTERN = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def routes():
+    """(name, method, path, form) for every page and API route."""
+    return [
+        ("venues", "GET", "/venues", None),
+        ("artists", "GET", "/artists", None),
+        ("shows", "GET", "/shows", None),
+        ("show_venue", "GET", "/venues/1", None),
+        ("show_artist", "GET", "/artists/1", None),
+        ("search_venues", "POST", "/venues/search", {"search_term": "velvet"}),
+        ("search_artists", "POST", "/artists/search", {"search_term": "band"}),
+        ("suggest", "GET", "/search/suggest?q=velv", None),
+        ("api_venues", "GET", "/api/v1/venues", None),
+        ("api_shows", "GET", "/api/v1/shows", None),
+        ("api_search", "GET", "/api/v1/search?type=artists&q=golden", None),
+    ]
+
+
+def load_catalog(app, scale):
+    from bulk_import import import_catalog
+    from models import db, recompute_upcoming_shows_counts
+
+    num_shows, num_venues, num_artists = SCALES[scale]
+    with tempfile.TemporaryDirectory() as out_dir, app.app_context():
+        db.session.execute(
+            'TRUNCATE "show", show_summary, venue, artist, import_checkpoint'
+        )
+        db.session.commit()
+        paths = write_dataset(out_dir, num_venues, num_artists, num_shows)
+        for kind in ("venues", "artists", "shows"):
+            import_catalog(kind, paths[kind], report=lambda message: None)
+        recompute_upcoming_shows_counts()
+        db.session.execute("ANALYZE")
+        db.session.commit()
+
+
+def measure(client, method, path, form, iterations):
+    request = client.get if method == "GET" else client.post
+    for _ in range(3):
+        request(path, data=form)
+
+    latencies, queries = [], 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = request(path, data=form)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        match = QUERIES_PATTERN.search(response.headers.get("Server-Timing", ""))
+        queries = max(queries, int(match.group(1)) if match else 0)
+
+    tracemalloc.start()
+    request(path, data=form)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(quantiles[94], 2),
+        "p99_ms": round(quantiles[98], 2),
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def missing_baselines(results, baseline):
+    """The "scale route" pairs of `results` that `baseline` has no entry for."""
+    return [
+        f"{scale} {route}"
+        for scale, scale_results in results.items()
+        for route in scale_results
+        if route not in baseline.get(scale, {})
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline` as readable strings;
+    routes without a baseline entry are left to missing_baselines()."""
+    regressions = []
+    for scale, scale_results in results.items():
+        for route, current in scale_results.items():
+            previous = baseline.get(scale, {}).get(route)
+            if previous is None:
+                continue
+            if current["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{scale} {route}: {current['queries']} queries "
+                    f"(baseline {previous['queries']})"
+                )
+            for metric in ("p95_ms", "peak_kb"):
+                if current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{scale} {route}: {metric} {current[metric]} "
+                        f"(baseline {previous[metric]}, tolerance {tolerance:.0%})"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="fail on scales and routes missing from the baseline",
+    )
+    parser.add_argument(
+        "--skip-load",
+        action="store_true",
+        help="reuse the data already in the benchmark database",
+    )
+    args = parser.parse_args()
+
+    database_url = os.environ.get("BENCHMARK_DATABASE_URL")
+    if not database_url:
+        parser.error("set BENCHMARK_DATABASE_URL to a disposable database")
+
+    from app import app, cache
+
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        WTF_CSRF_ENABLED=False,
+        SERVER_TIMING=True,
+    )
+    # measure the database path, not the page cache
+    cache.backend = None
+
+    results = {}
+    for scale in args.scale or ["10k"]:
+        if not args.skip_load:
+            print(f"Loading {scale} catalog...", file=sys.stderr)
+            load_catalog(app, scale)
+        client = app.test_client()
+        results[scale] = {}
+        for name, method, path, form in routes():
+            results[scale][name] = measure(client, method, path, form, args.iterations)
+            print(f"{scale:>5} {name:<15} {results[scale][name]}", file=sys.stderr)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"Baseline written to {BASELINE_PATH}", file=sys.stderr)
+        return 0
+
+    # a route without a baseline cannot be checked: under --strict that
+    # fails the run rather than passing it unchecked
+    missing = missing_baselines(results, baseline)
+    for entry in missing:
+        print(
+            f"NO BASELINE {entry}: record it with --update-baseline",
+            file=sys.stderr,
+        )
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions or (missing and args.strict) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
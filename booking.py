@@ -0,0 +1,324 @@
+# ----------------------------------------------------------------------------#
+# Show booking checks and set-wise show creation.
+# ----------------------------------------------------------------------------#
+
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from dateutil import rrule
+from flask import current_app
+from sqlalchemy import text
+
+from models import db, Artist, Show, Venue, record_shows_added
+from partitions import add_months, ensure_partitions, month_start
+
+Booking = namedtuple("Booking", "venue_id artist_id start_time end_time")
+
+# (booking index, form/JSON field, message)
+Problem = namedtuple("Problem", "index field message")
+
+FREQUENCIES = {"weekly": rrule.WEEKLY, "monthly": rrule.MONTHLY}
+
+# Existing shows overlapping a set of proposed bookings, one row per clash.
+# Each branch probes the GiST indexes of the matching per-partition exclusion
+# constraints (ex_show_pYYYY_MM_venue_during / _artist_during). Show lengths
+# are unbounded, so no partition can be pruned: every month still attached is
+# probed, one index lookup each, which `flask archive-shows` keeps in check.
+CONFLICTS_SQL = text(
+    """
+    WITH booking AS (
+        SELECT * FROM unnest(
+            CAST(:venue_ids AS integer[]),
+            CAST(:artist_ids AS integer[]),
+            CAST(:start_times AS timestamp[]),
+            CAST(:end_times AS timestamp[])
+        ) WITH ORDINALITY AS b (venue_id, artist_id, start_time, end_time, position)
+    )
+    SELECT b.position - 1 AS booking, 'venue' AS clash, s.id AS show_id,
+           s.start_time, s.end_time
+    FROM booking b JOIN show s ON s.venue_id = b.venue_id
+     AND s.during && tsrange(b.start_time, b.end_time)
+    UNION ALL
+    SELECT b.position - 1, 'artist', s.id, s.start_time, s.end_time
+    FROM booking b JOIN show s ON s.artist_id = b.artist_id
+     AND s.during && tsrange(b.start_time, b.end_time)
+    ORDER BY 1, 2, 4
+    """
+)
+
+
+# Serializes the bookings of each venue and artist until the transaction
+# ends. The exclusion constraints only hold within one monthly partition, so
+# a show running past midnight at the end of a month is not checked against
+# the next month's shows by PostgreSQL; holding these locks from the checks
+# to the commit makes check_bookings() authoritative for those.
+LOCK_SQL = text(
+    """
+    SELECT pg_advisory_xact_lock(owner.kind, owner.id)
+    FROM unnest(CAST(:kinds AS integer[]), CAST(:ids AS integer[])) AS owner (kind, id)
+    """
+)
+VENUE_LOCK, ARTIST_LOCK = 1, 2
+
+
+def default_duration():
+    return timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION_MINUTES"])
+
+
+# ----------------------------------------------------------------------------#
+# Recurrence.
+# ----------------------------------------------------------------------------#
+
+
+def occurrences(booking, rule):
+    """Copies of `booking` at every start time of `rule` (a dateutil rrule
+    starting at booking.start_time), keeping its duration.
+
+    Raises ValueError past SHOW_BATCH_LIMIT occurrences, which also stops
+    rules without COUNT or UNTIL.
+    """
+    limit = current_app.config["SHOW_BATCH_LIMIT"]
+    starts = list(islice(rule, limit + 1))
+    if len(starts) > limit:
+        raise ValueError(f"The pattern repeats more than {limit} times.")
+    duration = booking.end_time - booking.start_time
+    return [
+        booking._replace(start_time=start, end_time=start + duration)
+        for start in starts
+    ]
+
+
+def repeat(booking, frequency, count=None, until=None, interval=1):
+    """Weekly or monthly repetitions of `booking`, `count` times or up to and
+    including `until`."""
+    rule = rrule.rrule(
+        FREQUENCIES[frequency],
+        dtstart=booking.start_time,
+        interval=interval,
+        count=count,
+        until=until,
+    )
+    return occurrences(booking, rule)
+
+
+def repeat_rrule(booking, rule):
+    """Repetitions of `booking` following an RFC 5545 RRULE string such as
+    "FREQ=WEEKLY;BYDAY=FR;COUNT=52"."""
+    return occurrences(booking, rrule.rrulestr(rule, dtstart=booking.start_time))
+
+
+# ----------------------------------------------------------------------------#
+# Checks.
+# ----------------------------------------------------------------------------#
+
+
+def find_conflicts(bookings):
+    """Existing shows clashing with any of `bookings` (Booking tuples), as
+    rows of (booking index, "venue" or "artist", show_id, start_time,
+    end_time), in one query whatever the number of bookings."""
+    if not bookings:
+        return []
+    return db.session.execute(
+        CONFLICTS_SQL,
+        {
+            "venue_ids": [booking.venue_id for booking in bookings],
+            "artist_ids": [booking.artist_id for booking in bookings],
+            "start_times": [booking.start_time for booking in bookings],
+            "end_times": [booking.end_time for booking in bookings],
+        },
+    ).fetchall()
+
+
+def lock_owners(bookings):
+    """Lock the venues and artists of `bookings` for the transaction, in a
+    fixed order so concurrent batches cannot deadlock."""
+    owners = sorted(
+        {(VENUE_LOCK, booking.venue_id) for booking in bookings}
+        | {(ARTIST_LOCK, booking.artist_id) for booking in bookings}
+    )
+    db.session.execute(
+        LOCK_SQL,
+        {
+            "kinds": [kind for kind, _ in owners],
+            "ids": [owner_id for _, owner_id in owners],
+        },
+    )
+
+
+def missing_ids(venue_ids, artist_ids):
+    """The venue and artist ids among the given ones that do not exist."""
+    venue_ids, artist_ids = set(venue_ids), set(artist_ids)
+    venues = db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))
+    artists = db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))
+    found_venues = {venue_id for (venue_id,) in venues}
+    found_artists = {artist_id for (artist_id,) in artists}
+    return venue_ids - found_venues, artist_ids - found_artists
+
+
+def conflict_message(conflict):
+    if conflict.clash == "venue":
+        who = "The venue"
+    else:
+        who = "The artist"
+    return (
+        f"{who} is already booked from {conflict.start_time:%Y-%m-%d %H:%M} "
+        f"to {conflict.end_time:%Y-%m-%d %H:%M} (show {conflict.show_id})."
+    )
+
+
+def _overlaps_within(bookings):
+    """Bookings overlapping an earlier one of the same batch at the same
+    venue or with the same artist."""
+    problems = []
+    for field in ("venue_id", "artist_id"):
+        by_owner = defaultdict(list)
+        for index, booking in enumerate(bookings):
+            by_owner[getattr(booking, field)].append(index)
+        for indexes in by_owner.values():
+            indexes.sort(key=lambda index: bookings[index].start_time)
+            booked_until = None
+            for index in indexes:
+                booking = bookings[index]
+                if booked_until is not None and booking.start_time < booked_until:
+                    problems.append(
+                        Problem(index, field, "Overlaps another show of this batch.")
+                    )
+                booked_until = max(booked_until or booking.end_time, booking.end_time)
+    return problems
+
+
+def check_bookings(bookings):
+    """Every problem preventing `bookings` from being created: unknown venue
+    or artist ids, empty time ranges and overlaps, within the batch or with
+    existing shows. A fixed number of queries for any number of bookings.
+
+    Call it in the transaction that creates the bookings, before anything
+    else reads the show table: it makes sure their monthly partitions exist
+    and locks their venues and artists until the commit.
+    """
+    problems = []
+    horizon = add_months(
+        month_start(datetime.now()), current_app.config["SHOW_BOOKING_MONTHS_AHEAD"] + 1
+    )
+    missing_venues, missing_artists = missing_ids(
+        [booking.venue_id for booking in bookings],
+        [booking.artist_id for booking in bookings],
+    )
+    for index, booking in enumerate(bookings):
+        # each unknown id is reported once, at its first booking
+        if booking.venue_id in missing_venues:
+            missing_venues.discard(booking.venue_id)
+            problems.append(
+                Problem(
+                    index, "venue_id", f"There is no venue with ID {booking.venue_id}."
+                )
+            )
+        if booking.artist_id in missing_artists:
+            missing_artists.discard(booking.artist_id)
+            problems.append(
+                Problem(
+                    index,
+                    "artist_id",
+                    f"There is no artist with ID {booking.artist_id}.",
+                )
+            )
+        if booking.end_time <= booking.start_time:
+            problems.append(
+                Problem(index, "end_time", "The show must end after it starts.")
+            )
+        if booking.start_time.date() >= horizon:
+            problems.append(
+                Problem(
+                    index,
+                    "start_time",
+                    f"Shows can only be booked before {horizon:%Y-%m}.",
+                )
+            )
+    if problems:
+        return sorted(problems)
+
+    # before the first read of the show table, see ensure_partitions()
+    ensure_partitions(booking.start_time for booking in bookings)
+    lock_owners(bookings)
+
+    problems.extend(_overlaps_within(bookings))
+    for conflict in find_conflicts(bookings):
+        field = "venue_id" if conflict.clash == "venue" else "artist_id"
+        problems.append(Problem(conflict.booking, field, conflict_message(conflict)))
+    return sorted(problems)
+
+
+def insert_shows(bookings):
+    """Insert `bookings`, checked by check_bookings() in the same transaction,
+    with one multi-row INSERT and update the venue and artist counters
+    set-wise; the caller commits. Returns the new show ids in booking order."""
+    result = db.session.execute(
+        Show.__table__.insert()
+        .values([booking._asdict() for booking in bookings])
+        .returning(Show.id)
+    )
+    show_ids = [show_id for (show_id,) in result]
+    record_shows_added(bookings)
+    return show_ids
+
+
+def booking_namespaces(bookings):
+    """Cache namespaces to invalidate after creating `bookings`."""
+    return (
+        ["shows", "venues"]
+        + [f"venue:{venue_id}" for venue_id in {b.venue_id for b in bookings}]
+        + [f"artist:{artist_id}" for artist_id in {b.artist_id for b in bookings}]
+    )
+
+
+# ----------------------------------------------------------------------------#
+# ShowForm.
+# ----------------------------------------------------------------------------#
+
+
+def bookings_from_form(form):
+    """The bookings described by a validated ShowForm, repetitions included."""
+    start_time = form.start_time.data
+    booking = Booking(
+        form.venue_id.data,
+        form.artist_id.data,
+        start_time,
+        start_time + timedelta(minutes=form.duration.data),
+    )
+    if not form.repeat.data:
+        return [booking]
+    until = form.repeat_until.data
+    return repeat(
+        booking,
+        form.repeat.data,
+        count=form.repeat_count.data,
+        until=until and datetime.combine(until, time.max),
+    )
+
+
+def check_show_form(form):
+    """Expand and check a validated ShowForm, adding the problems to its
+    fields. Returns the bookings to create, or None."""
+    try:
+        bookings = bookings_from_form(form)
+    except ValueError as error:
+        form.repeat.errors.append(str(error))
+        return None
+    report_problems(form, bookings, check_bookings(bookings))
+    return None if form.errors else bookings
+
+
+def report_problems(form, bookings, problems):
+    for problem in problems:
+        field = getattr(form, problem.field, form.start_time)
+        message = problem.message
+        if len(bookings) > 1:
+            message = f"{bookings[problem.index].start_time:%Y-%m-%d}: {message}"
+        field.errors.append(message)
+
+
+def is_booking_conflict(error):
+    """Whether an IntegrityError came from a booking exclusion constraint,
+    i.e. a concurrent booking won the race after the bookings were checked."""
+    return getattr(error.orig, "pgcode", None) == "23P01"
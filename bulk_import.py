@@ -0,0 +1,383 @@
+# ----------------------------------------------------------------------------#
+# Bulk catalog import through PostgreSQL COPY.
+# ----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import func
+
+from forms import canonical_genre
+from models import db, ImportCheckpoint
+from partitions import ensure_partitions
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(value, required=False):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError("value is required")
+        return None
+    return str(value).strip()
+
+
+def _integer(value, required=True):
+    value = _text(value, required)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"{value!r} is not an integer")
+
+
+def _boolean(value, required=False):
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    value = _text(value, required)
+    if value is None:
+        return None
+    if value.lower() in ("1", "t", "true", "y", "yes"):
+        return "t"
+    if value.lower() in ("0", "f", "false", "n", "no"):
+        return "f"
+    raise RowError(f"{value!r} is not a boolean")
+
+
+def _timestamp(value, required=True):
+    value = _text(value, required)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise RowError(f"{value!r} is not an ISO 8601 timestamp")
+
+
+def _genres(value, required=False):
+    """Genres as a list (JSONL), or a JSON array / ';'-separated string (CSV),
+    spelled as in the genre vocabulary and rendered as a PostgreSQL array
+    literal for COPY."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise RowError(f"{value!r} is not a JSON array")
+        else:
+            value = value.split(";")
+    if value is not None and not isinstance(value, list):
+        raise RowError(f"{value!r} is not a list of genres")
+    genres = []
+    for name in value or []:
+        name = str(name).strip()
+        if not name:
+            continue
+        genre = canonical_genre(name)
+        if genre is None:
+            raise RowError(f"{name!r} is not a known genre")
+        genres.append(genre)
+    if not genres:
+        if required:
+            raise RowError("value is required")
+        return None
+    quoted = (
+        '"' + genre.replace("\\", "\\\\").replace('"', '\\"') + '"' for genre in genres
+    )
+    return "{" + ",".join(quoted) + "}"
+
+
+def _naive(value):
+    # COPY into a timestamp column ignores the UTC offset, so compare that way
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+def _check_show(row):
+    if row["end_time"] is not None and _naive(row["end_time"]) <= _naive(
+        row["start_time"]
+    ):
+        raise RowError("end_time is not after start_time")
+
+
+# column -> parser, in COPY order; the first column is the merge key. `check`
+# validates a parsed row as a whole.
+SCHEMAS = {
+    "venues": {
+        "table": "venue",
+        "columns": {
+            "id": _integer,
+            "name": lambda value: _text(value, required=True),
+            "city": lambda value: _text(value, required=True),
+            "state": lambda value: _text(value, required=True),
+            "address": lambda value: _text(value, required=True),
+            "phone": lambda value: _text(value, required=True),
+            "image_link": _text,
+            "facebook_link": _text,
+            "website": _text,
+            "seeking_talent": _boolean,
+            "seeking_description": _text,
+            "genres": _genres,
+        },
+    },
+    "artists": {
+        "table": "artist",
+        "columns": {
+            "id": _integer,
+            "name": lambda value: _text(value, required=True),
+            "city": lambda value: _text(value, required=True),
+            "state": lambda value: _text(value, required=True),
+            "phone": lambda value: _text(value, required=True),
+            "image_link": _text,
+            "facebook_link": _text,
+            "website": _text,
+            "seeking_venue": _boolean,
+            "seeking_description": _text,
+            "genres": _genres,
+        },
+    },
+    "shows": {
+        "table": "show",
+        "columns": {
+            "id": _integer,
+            "venue_id": _integer,
+            "artist_id": _integer,
+            "start_time": _timestamp,
+            # optional, defaults to start_time + SHOW_DEFAULT_DURATION_MINUTES
+            "end_time": lambda value: _timestamp(value, required=False),
+        },
+        "check": _check_show,
+    },
+}
+
+
+def read_records(path):
+    """Yield (line number, record) pairs from a .csv or .jsonl file, streaming.
+
+    Records are dicts; a JSONL line that does not parse is yielded as its
+    text, for validate_batch to reject.
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, line.strip()
+
+
+def validate_batch(records, columns, check=None):
+    """Split a batch of (line, record) pairs into COPY-ready tuples, ending
+    with the line number, and (line, record, error) rejects."""
+    valid, rejects = [], []
+    for line, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise RowError("line is not a JSON object")
+            row = {
+                column: parse(record.get(column)) for column, parse in columns.items()
+            }
+            if check is not None:
+                check(row)
+            valid.append((*row.values(), line))
+        except RowError as error:
+            rejects.append((line, record, str(error)))
+    return valid, rejects
+
+
+def _merge_sql(kind, table, columns):
+    names = ", ".join(f'"{column}"' for column in columns)
+    selected = ", ".join(f's."{column}"' for column in columns)
+    updates = ", ".join(
+        f'"{column}" = EXCLUDED."{column}"' for column in columns if column != "id"
+    )
+    moved = ""
+    key = "id"
+    if kind == "shows":
+        duration = current_app.config["SHOW_DEFAULT_DURATION_MINUTES"]
+        end_time = (
+            f"coalesce(s.end_time, s.start_time + interval '{int(duration)} minutes')"
+        )
+        selected = selected.replace('s."end_time"', end_time)
+        # rows whose venue or artist does not exist, or that overlap a show
+        # already booked for the venue or artist, are dropped set-wise
+        overlap = f"tsrange(s.start_time, {end_time})"
+        checks = (
+            "EXISTS (SELECT 1 FROM venue v WHERE v.id = s.venue_id) "
+            "AND EXISTS (SELECT 1 FROM artist a WHERE a.id = s.artist_id) "
+            "AND NOT EXISTS (SELECT 1 FROM show x WHERE x.id <> s.id "
+            f"AND x.venue_id = s.venue_id AND x.during && {overlap}) "
+            "AND NOT EXISTS (SELECT 1 FROM show x WHERE x.id <> s.id "
+            f"AND x.artist_id = s.artist_id AND x.during && {overlap}) "
+        )
+        condition = f"WHERE {checks}"
+        # show is partitioned on start_time, so its key is (id, start_time):
+        # a show moved to another time replaces its old row
+        key = "id, start_time"
+        moved = (
+            "WITH moved AS (DELETE FROM show previous USING import_staging s "
+            f"WHERE previous.id = s.id AND previous.start_time <> s.start_time AND {checks}) "
+        )
+    else:
+        updates += ", updated_at = now()"
+        condition = ""
+    # DISTINCT ON keeps one row per id, ON CONFLICT cannot touch a row twice
+    return (
+        f'{moved}INSERT INTO "{table}" ({names}) '
+        f"SELECT DISTINCT ON (s.id) {selected} FROM import_staging s {condition}"
+        f"ORDER BY s.id ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    )
+
+
+def _drop_overlaps(cursor, column):
+    """Delete the staged shows that overlap an earlier staged show of the
+    same `column` (venue_id or artist_id); returns their line numbers.
+
+    Like the migration's overlap scan this walks each venue's or artist's
+    rows in start_time order, but compares with the latest end of all the
+    earlier rows rather than lag()'s previous one: a long show can overlap
+    several that follow it.
+    """
+    duration = current_app.config["SHOW_DEFAULT_DURATION_MINUTES"]
+    cursor.execute(
+        "DELETE FROM import_staging s USING ("
+        "SELECT ctid AS target, start_time < max(coalesce(end_time, "
+        f"start_time + interval '{int(duration)} minutes')) OVER ("
+        f"PARTITION BY {column} ORDER BY start_time, line "
+        "ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS overlaps "
+        "FROM import_staging) earlier "
+        "WHERE s.ctid = earlier.target AND earlier.overlaps RETURNING s.line"
+    )
+    return [line for line, in cursor.fetchall()]
+
+
+def load_batch(kind, rows):
+    """COPY `rows` into a staging table and merge them into the live table.
+
+    Runs inside the session's transaction; returns the merged row count and
+    the (line, error) rejects of shows that overlap another one in `rows`.
+    """
+    schema = SCHEMAS[kind]
+    columns = list(schema["columns"])
+    names = ", ".join(f'"{column}"' for column in columns)
+
+    if kind == "shows":
+        # before the staging table below locks the show table
+        start_time = columns.index("start_time")
+        ensure_partitions(datetime.fromisoformat(row[start_time]) for row in rows)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute(
+        f'CREATE TEMP TABLE import_staging (LIKE "{schema["table"]}" INCLUDING DEFAULTS) '
+        "ON COMMIT DROP"
+    )
+    cursor.execute("ALTER TABLE import_staging ADD COLUMN line integer")
+    if kind == "shows":
+        # a missing end time is filled in by the merge
+        cursor.execute("ALTER TABLE import_staging ALTER COLUMN end_time DROP NOT NULL")
+    cursor.copy_expert(
+        f"COPY import_staging ({names}, line) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+    rejects = []
+    if kind == "shows":
+        # double bookings within the batch, which the merge cannot see
+        for column, owner in (("venue_id", "venue"), ("artist_id", "artist")):
+            error = f"overlaps an earlier show of the {owner} in the file"
+            rejects += [(line, error) for line in _drop_overlaps(cursor, column)]
+    cursor.execute(_merge_sql(kind, schema["table"], columns))
+    return cursor.rowcount, rejects
+
+
+def reset_sequence(table):
+    db.session.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f'coalesce(max(id), 1)) FROM "{table}"'
+    )
+
+
+def import_catalog(kind, path, batch_size=10000, report=print):
+    """Stream `path` into the `kind` table in validated, COPY-loaded batches.
+
+    Every batch commits together with its checkpoint, so a failed run can be
+    restarted with the same arguments and resumes after the last committed
+    batch. Invalid rows are written to `<path>.rejects.jsonl` with their line
+    number.
+    """
+    schema = SCHEMAS[kind]
+    source = os.path.abspath(path)
+    checkpoint = ImportCheckpoint.query.get((source, kind))
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source, kind=kind, records_done=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    skipped = checkpoint.records_done
+    if skipped:
+        report(f"Resuming {kind} import of {path} after record {skipped}.")
+
+    records = islice(read_records(path), skipped, None)
+    started = time.perf_counter()
+    processed = merged = rejected = 0
+    with open(source + ".rejects.jsonl", "a", encoding="utf-8") as rejects_file:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+            rows, rejects = validate_batch(
+                batch, schema["columns"], schema.get("check")
+            )
+            try:
+                batch_merged, overlaps = load_batch(kind, rows) if rows else (0, [])
+                checkpoint.records_done += len(batch)
+                checkpoint.updated_at = func.now()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            records_by_line = dict(batch)
+            rejects += [
+                (line, records_by_line[line], error) for line, error in overlaps
+            ]
+            for line, record, error in rejects:
+                rejects_file.write(
+                    json.dumps({"line": line, "error": error, "record": record}) + "\n"
+                )
+            if kind == "shows":
+                # missing venue/artist and rows double-booked against the
+                # live table were filtered out by the merge
+                rejected += len(rows) - len(overlaps) - batch_merged
+            processed += len(batch)
+            merged += batch_merged
+            rejected += len(rejects)
+
+            elapsed = time.perf_counter() - started
+            report(
+                f"{kind}: {skipped + processed} records read, {merged} merged, "
+                f"{rejected} rejected ({processed / elapsed:,.0f} records/s)"
+            )
+
+    reset_sequence(schema["table"])
+    db.session.delete(checkpoint)
+    db.session.commit()
+    return {"processed": processed, "merged": merged, "rejected": rejected}
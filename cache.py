@@ -0,0 +1,187 @@
+# ----------------------------------------------------------------------------#
+# Page data cache.
+# ----------------------------------------------------------------------------#
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from blinker import signal
+
+# Sent by Cache with stat="hits", "misses", "sets" or "invalidations" on every
+# count, for exporters that aggregate the statistics of all worker processes.
+cache_counted = signal("fyyur-cache-counted")
+
+
+class LRUBackend:
+    """In-process cache with per-entry TTL, evicting least recently used
+    entries once either `max_entries` or `max_bytes` is exceeded."""
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, expires)
+            self._bytes += len(value)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def incr(self, key):
+        # counters live outside the LRU so a generation is never evicted
+        with self._lock:
+            self._counters[key] = self._counters.get(key, time.time_ns()) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.setdefault(key, time.time_ns())
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+
+class RedisBackend:
+    """Shared cache on top of a Redis (or Redis-compatible) client.
+
+    Any client exposing get/set(ex=, nx=)/delete/incr works, so a local
+    stand-in such as fakeredis can replace a real server.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        self.counter(key)
+        return int(self.client.incr(key))
+
+    def counter(self, key):
+        # seed missing generations with the clock so an evicted counter can
+        # never fall back to a generation that is still cached
+        self.client.set(key, time.time_ns(), nx=True)
+        return int(self.client.get(key))
+
+
+class Cache:
+    """Generational cache for view data.
+
+    Every entry belongs to one or more namespaces (e.g. "venues" or
+    "venue:12"). Invalidating a namespace bumps its generation, which
+    changes the key of every entry in it, so precise invalidation does not
+    need to enumerate keys.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.default_ttl = None
+        self.prefix = "fyyur:"
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "lru")
+        app.config.setdefault("CACHE_DEFAULT_TTL", 300)
+        app.config.setdefault("CACHE_MAX_ENTRIES", 2048)
+        app.config.setdefault("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        app.config.setdefault("CACHE_KEY_PREFIX", "fyyur:")
+
+        backend = app.config["CACHE_BACKEND"]
+        if backend == "redis":
+            import redis
+
+            self.backend = RedisBackend(
+                redis.Redis.from_url(app.config["CACHE_REDIS_URL"])
+            )
+        elif backend == "lru":
+            self.backend = LRUBackend(
+                max_entries=app.config["CACHE_MAX_ENTRIES"],
+                max_bytes=app.config["CACHE_MAX_BYTES"],
+            )
+        elif backend is None:
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend!r}")
+
+        self.default_ttl = app.config["CACHE_DEFAULT_TTL"]
+        self.prefix = app.config["CACHE_KEY_PREFIX"]
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+        cache_counted.send(self, stat=stat)
+
+    def _key(self, namespaces, key):
+        generations = ":".join(
+            f"{namespace}@{self.backend.counter(self.prefix + 'gen:' + namespace)}"
+            for namespace in namespaces
+        )
+        return f"{self.prefix}{generations}:{key}"
+
+    def get_or_set(self, namespaces, key, create, ttl=None):
+        """Return the cached value for `key`, calling `create` on a miss."""
+        if self.backend is None:
+            return create()
+
+        cache_key = self._key(namespaces, key)
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            self._count("hits")
+            return pickle.loads(cached)
+
+        self._count("misses")
+        value = create()
+        self.backend.set(cache_key, pickle.dumps(value), ttl or self.default_ttl)
+        self._count("sets")
+        return value
+
+    def invalidate(self, *namespaces):
+        """Drop every entry in `namespaces`."""
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            self.backend.incr(self.prefix + "gen:" + namespace)
+            self._count("invalidations")
+
+    def hit_ratio(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
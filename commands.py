@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------#
+# Flask CLI commands.
+# ----------------------------------------------------------------------------#
+
+import click
+
+from bulk_import import SCHEMAS, import_catalog
+from models import recompute_upcoming_shows_counts
+from partitions import archive_partitions, create_future_partitions
+
+
+@click.command("recompute-upcoming-counts")
+def recompute_upcoming_counts_command():
+    """Age past shows out of the venue/artist upcoming show counters.
+
+    Schedule this (e.g. hourly from cron); the write handlers keep the
+    counters exact for new and deleted shows in between runs.
+    """
+    changed = recompute_upcoming_shows_counts()
+    click.echo(f"Updated {changed} upcoming show counters.")
+
+
+@click.command("import-catalog")
+@click.argument("kind", type=click.Choice(sorted(SCHEMAS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=10000, show_default=True)
+def import_catalog_command(kind, path, batch_size):
+    """Bulk load venues, artists or shows from a .csv or .jsonl file.
+
+    Records need an `id` so they can be merged idempotently; import venues
+    and artists before their shows. Re-running an interrupted import with
+    the same arguments resumes after the last committed batch.
+    """
+    result = import_catalog(kind, path, batch_size=batch_size, report=click.echo)
+    if kind == "shows":
+        recompute_upcoming_shows_counts()
+    click.echo(
+        f"Done: {result['merged']} {kind} merged, {result['rejected']} rejected "
+        f"(see {path}.rejects.jsonl)."
+    )
+
+
+@click.command("create-show-partitions")
+@click.option(
+    "--months-ahead",
+    type=int,
+    default=None,
+    help="Months after this one to cover [default: SHOW_PARTITION_MONTHS_AHEAD].",
+)
+def create_show_partitions_command(months_ahead):
+    """Create the monthly show partitions from this month on.
+
+    Schedule this (e.g. daily from cron) so bookings rarely have to create
+    a partition themselves.
+    """
+    created = create_future_partitions(months_ahead)
+    click.echo(f"Created {created} show partitions.")
+
+
+@click.command("archive-shows")
+@click.option(
+    "--before",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="Archive the months ended by this date [default: SHOW_ARCHIVE_AFTER_MONTHS ago].",
+)
+@click.option(
+    "--drop",
+    is_flag=True,
+    help="Drop the detached partitions instead of keeping them as show_archived_YYYY_MM.",
+)
+def archive_shows_command(before, drop):
+    """Move the shows of old months out of the show table.
+
+    The shows of each old monthly partition are counted per venue, artist
+    and month into show_summary, which the past show counts include, then
+    the partition is detached. Detaching briefly locks the show table.
+    """
+    archived = archive_partitions(before, drop=drop, report=click.echo)
+    click.echo(f"Archived {len(archived)} show partitions.")
+
+
+def init_app(app):
+    app.cli.add_command(recompute_upcoming_counts_command)
+    app.cli.add_command(import_catalog_command)
+    app.cli.add_command(create_show_partitions_command)
+    app.cli.add_command(archive_shows_command)
@@ -0,0 +1,81 @@
+# ----------------------------------------------------------------------------#
+# Conditional GET (ETag / Last-Modified).
+# ----------------------------------------------------------------------------#
+
+import hashlib
+import time
+from datetime import timezone
+
+from flask import current_app, make_response, request, session
+
+from signing import verification_keys
+
+
+def csrf_version():
+    """The part of a page that changes with the CSRF token it embeds: the
+    signing key and the half of WTF_CSRF_TIME_LIMIT the page is served in.
+
+    A page revalidated with a 304 keeps the token it was rendered with, which
+    is then at most half the time limit old, and never one signed with a key
+    that has since been rotated out.
+    """
+    signing_key = verification_keys(current_app)[-1]
+    key_id = hashlib.sha256(str(signing_key).encode("utf-8")).hexdigest()[:16]
+    time_limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    window = int(time.time() // (time_limit / 2)) if time_limit else None
+    return key_id, window
+
+
+def make_etag(*parts):
+    """Strong ETag over the request path, the embedded CSRF token's key and
+    validity window and the given version parts."""
+    digest = hashlib.sha1(
+        repr((request.full_path, csrf_version()) + parts).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+def _as_http_date(value):
+    # the database stores naive timestamps; HTTP dates have 1s resolution
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified):
+    """Whether the request's validators match the current representation.
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2).
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return _as_http_date(last_modified) <= request.if_modified_since
+    return False
+
+
+def conditional_response(etag, last_modified, render):
+    """Answer with 304 when the client is up to date, otherwise call `render`.
+
+    Pages carrying a pending flash message are always rendered in full and
+    never stored, so the message is not lost in a 304 or replayed from the
+    browser cache. Responses are private because pages embed the visitor's
+    CSRF token.
+    """
+    if "_flashes" in session:
+        response = make_response(render())
+        response.cache_control.no_store = True
+        return response
+
+    if is_not_modified(etag, last_modified):
+        response = make_response("", 304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_http_date(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
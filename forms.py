@@ -8,10 +8,12 @@ from wtforms import (
     SelectField,
     SelectMultipleField,
     DateTimeField,
+    DateField,
     BooleanField,
+    IntegerField,
     ValidationError,
 )
-from wtforms.validators import DataRequired, URL, Optional
+from wtforms.validators import DataRequired, InputRequired, NumberRange, URL, Optional
 
 
 state_choices = [
@@ -90,13 +92,86 @@ genre_choices = [
     ("Other", "Other"),
 ]
 
+# The genre and state vocabularies: listing filters and imports only accept
+# these, genres matched case-insensitively
+GENRES = {value.lower(): value for value, _ in genre_choices}
+STATES = {value for value, _ in state_choices}
+
+
+def canonical_genre(name):
+    """The vocabulary spelling of genre `name`, or None if it is unknown."""
+    return GENRES.get(name.strip().lower())
+
+
+def catalog_filters(args):
+    """(genres, state) to filter the venue/artist listings by, from repeated
+    `genre` and a `state` query argument; blank values are ignored.
+
+    Raises ValueError for a genre or state outside the vocabulary.
+    """
+    genres = set()
+    for name in args.getlist("genre"):
+        if not name.strip():
+            continue
+        genre = canonical_genre(name)
+        if genre is None:
+            raise ValueError(f"Unknown genre {name.strip()!r}.")
+        genres.add(genre)
+    state = args.get("state", "").strip().upper() or None
+    if state is not None and state not in STATES:
+        raise ValueError(f"Unknown state {state!r}.")
+    return sorted(genres), state
+
+
+def facet_filters(args):
+    """Filters of a faceted search as keyword arguments for
+    models.search_query() and models.facet_counts(): genre and state as in
+    catalog_filters(), plus `city` and `seeking` ("1" or "0").
+
+    Raises ValueError for values outside the vocabularies.
+    """
+    genres, state = catalog_filters(args)
+    seeking = args.get("seeking", "").strip()
+    if seeking not in ("", "0", "1"):
+        raise ValueError("'seeking' must be 1 or 0.")
+    return {
+        "genres": genres,
+        "state": state,
+        "city": args.get("city", "").strip() or None,
+        "seeking": {"1": True, "0": False}.get(seeking),
+    }
+
 
 class ShowForm(Form):
-    artist_id = StringField("artist_id")
-    venue_id = StringField("venue_id")
+    artist_id = IntegerField("artist_id", validators=[InputRequired()])
+    venue_id = IntegerField("venue_id", validators=[InputRequired()])
     start_time = DateTimeField(
         "start_time", validators=[DataRequired()], default=datetime.today()
     )
+    # minutes; the end time is start_time + duration
+    duration = IntegerField(
+        "duration", validators=[DataRequired(), NumberRange(min=15, max=24 * 60)]
+    )
+    # optional repetition of the show (see booking.repeat())
+    repeat = SelectField(
+        "repeat",
+        choices=[
+            ("", "Does not repeat"),
+            ("weekly", "Every week"),
+            ("monthly", "Every month"),
+        ],
+        default="",
+    )
+    repeat_count = IntegerField(
+        "repeat_count", validators=[Optional(), NumberRange(min=1)]
+    )
+    repeat_until = DateField("repeat_until", validators=[Optional()])
+
+    def validate_repeat(self, repeat):
+        if repeat.data and not (self.repeat_count.data or self.repeat_until.data):
+            raise ValidationError(
+                "Give the number of shows or the date of the last one."
+            )
 
 
 class ContactForm(Form):
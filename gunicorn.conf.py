@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------------#
+# Gunicorn settings.
+#
+#   FYYUR_SECRET_KEYS=... gunicorn app:app
+#
+# Every value can be overridden from the environment, so the same file is
+# used on every node and sized to that node's cores.
+# ----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# gunicorn serves production: without this, an unset FYYUR_CONFIG would run
+# the development profile, with the debugger and its published secret key.
+# The production profile refuses to start without FYYUR_SECRET_KEYS.
+os.environ.setdefault("FYYUR_CONFIG", "production")
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+
+# Load the app once in the master and fork it into the workers: shorter
+# startups and templates/modules shared copy-on-write.
+preload_app = True
+
+# Requests spend most of their time waiting on PostgreSQL, so each worker
+# runs a few threads; one process per core scales the CPU-bound rendering.
+# The threads already overlap the waits the sync-worker 2n+1 rule is for,
+# and every worker holds a pool of GUNICORN_THREADS connections (config.py).
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# Keep connections from the load balancer open between requests; this must
+# stay below the balancer's own idle timeout.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Recycle workers to bound slow memory growth; the jitter keeps them from
+# all restarting at the same moment.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# Trust X-Forwarded-* from the load balancer in front of the nodes.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# The app logs its requests itself, as JSON with timings (see logs.py); set
+# GUNICORN_ACCESS_LOG (e.g. "-") for gunicorn's own synchronous access log.
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")
+errorlog = "-"
+
+# Prometheus multiprocess mode: every worker writes its metrics to files in
+# this directory and /metrics adds them up. It has to exist before the app
+# (and prometheus_client) is preloaded, which happens right after this file
+# is loaded and before any server hook runs. Files left by a previous run
+# would be added to this run's counters.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "fyyur-metrics")
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # build the typeahead index once, the workers inherit it on fork
+    from app import app, suggestions
+    from partitions import create_future_partitions
+
+    try:
+        suggestions.build()
+    except Exception:
+        server.log.exception("Suggest index not built, workers build it on first use")
+
+    # top up the monthly show partitions on every deploy, on top of the
+    # scheduled `flask create-show-partitions`
+    try:
+        with app.app_context():
+            create_future_partitions()
+    except Exception:
+        server.log.exception(
+            "Show partitions not created, bookings create them on demand"
+        )
+
+
+def post_fork(server, worker):
+    # connections opened in the master while preloading must not be shared
+    # between the forked workers
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose()
+
+
+def child_exit(server, worker):
+    # drop the gauges of the dead worker; its counters stay in the totals
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,98 @@
+# ----------------------------------------------------------------------------#
+# Per-request SQL and render instrumentation.
+# ----------------------------------------------------------------------------#
+
+import time
+
+from flask import (
+    before_render_template,
+    current_app,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    if has_request_context() and "request_start" in g:
+        g.query_count += 1
+        g.db_time += elapsed
+
+
+def _before_render(sender, template, context, **extra):
+    if "request_start" in g:
+        g.render_start = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    if "render_start" in g:
+        g.render_time += time.perf_counter() - g.pop("render_start")
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.query_count = 0
+    g.db_time = 0.0
+    g.render_time = 0.0
+
+
+def _finish_request(response):
+    if "request_start" not in g:
+        return response
+
+    total_ms = (time.perf_counter() - g.request_start) * 1000
+    db_ms = g.db_time * 1000
+    render_ms = g.render_time * 1000
+    endpoint = request.endpoint or "<unmatched>"
+
+    config = current_app.config
+    if config["SERVER_TIMING"]:
+        response.headers["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db_ms:.1f};desc="{g.query_count} queries"',
+                f"render;dur={render_ms:.1f}",
+                f"total;dur={total_ms:.1f}",
+            ]
+        )
+
+    query_budget = config["SLOW_REQUEST_QUERY_BUDGET"]
+    time_budget = config["SLOW_REQUEST_MS_BUDGET"]
+    if (query_budget is not None and g.query_count > query_budget) or (
+        time_budget is not None and total_ms > time_budget
+    ):
+        current_app.logger.warning(
+            "Request over budget: %s %s (%s) queries=%d db=%.1fms render=%.1fms total=%.1fms",
+            request.method,
+            request.path,
+            endpoint,
+            g.query_count,
+            db_ms,
+            render_ms,
+            total_ms,
+        )
+
+    return response
+
+
+def init_app(app):
+    """Hook the instrumentation into `app` and every SQLAlchemy engine."""
+    app.config.setdefault("SERVER_TIMING", True)
+    app.config.setdefault("SLOW_REQUEST_QUERY_BUDGET", None)
+    app.config.setdefault("SLOW_REQUEST_MS_BUDGET", None)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
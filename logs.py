@@ -0,0 +1,173 @@
+# ----------------------------------------------------------------------------#
+# Structured logging off the request path.
+# ----------------------------------------------------------------------------#
+
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import current_app, g, has_request_context, request
+from flask.logging import default_handler
+
+# Request ids accepted from the X-Request-ID header of a proxy; anything else
+# is replaced by a fresh id.
+REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, the request
+    it belongs to and the fields passed as extra={"fields": {...}}."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+            entry["method"] = record.method
+            entry["path"] = record.path
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records logged while handling a request with its id, method and
+    path; runs in the request's thread, before the record is queued."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class BackgroundHandler(QueueHandler):
+    """Hand records to a QueueListener thread that writes them to `handlers`,
+    so requests never wait on a disk or a pipe.
+
+    The listener is started by the first record of each process: a thread
+    started in the gunicorn master does not survive the fork into the
+    workers.
+    """
+
+    def __init__(self, *handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # merge the arguments and render the traceback now: the objects they
+        # refer to may have changed by the time the listener formats them
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        self.queue.put_nowait(record)
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # records queued by the parent process are written by the parent
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(
+                self.queue, *self.handlers, respect_handler_level=True
+            )
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def close(self):
+        # called by logging.shutdown() at exit: write out what is queued
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def _start_request():
+    request_id = request.headers.get("X-Request-ID", "")
+    g.request_id = request_id if REQUEST_ID.fullmatch(request_id) else uuid.uuid4().hex
+
+
+def _log_request(response):
+    # the timings and query counts come from instrumentation.py
+    if "request_start" not in g:
+        return response
+    response.headers["X-Request-ID"] = g.request_id
+
+    # failures are always logged, successes only at LOG_SUCCESS_SAMPLE_RATE
+    sample_rate = current_app.config["LOG_SUCCESS_SAMPLE_RATE"]
+    if response.status_code < 400 and random.random() >= sample_rate:
+        return response
+
+    current_app.logger.info(
+        "%s %s %s",
+        request.method,
+        request.path,
+        response.status_code,
+        extra={
+            "fields": {
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - g.request_start) * 1000, 1),
+                "queries": g.query_count,
+                "db_ms": round(g.db_time * 1000, 1),
+                "render_ms": round(g.render_time * 1000, 1),
+                "sample_rate": sample_rate if response.status_code < 400 else 1.0,
+            }
+        },
+    )
+    return response
+
+
+def init_app(app):
+    """Log `app` as JSON lines through a background thread, with a request id
+    on every record and a (sampled) record per request; runs first so the id
+    is set before any other before_request function logs."""
+    app.config.setdefault("LOG_LEVEL", "INFO")
+    app.config.setdefault("LOG_FILE", None)
+    app.config.setdefault("LOG_SUCCESS_SAMPLE_RATE", 1.0)
+
+    if app.config["LOG_FILE"]:
+        output = logging.FileHandler(app.config["LOG_FILE"])
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter())
+
+    handler = BackgroundHandler(output)
+    handler.addFilter(RequestContextFilter())
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(app.config["LOG_LEVEL"])
+
+    app.before_request(_start_request)
+    app.after_request(_log_request)
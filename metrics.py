@@ -0,0 +1,137 @@
+# ----------------------------------------------------------------------------#
+# Prometheus metrics.
+# ----------------------------------------------------------------------------#
+
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from cache import cache_counted
+from models import db
+
+# Under gunicorn every worker process writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) and /metrics, served by
+# whichever worker gets the scrape, adds up the files of all workers. The
+# variable must be set before prometheus_client is imported.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUESTS = Counter(
+    "fyyur_http_requests_total",
+    "HTTP requests handled.",
+    ["method", "endpoint", "status"],
+)
+REQUEST_SECONDS = Histogram(
+    "fyyur_http_request_duration_seconds",
+    "Time from the start of a request to its response.",
+    ["method", "endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_BYTES = Histogram(
+    "fyyur_http_response_size_bytes",
+    "Size of response bodies; streamed responses are not counted.",
+    ["method", "endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+REQUEST_QUERIES = Histogram(
+    "fyyur_db_queries_per_request",
+    "SQL statements executed by a request.",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "fyyur_db_query_duration_seconds",
+    "Time a request spent executing SQL statements.",
+    ["endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+POOL_CHECKED_OUT = Gauge(
+    "fyyur_db_pool_checked_out_connections",
+    "Connections currently checked out of the pools of all workers.",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+POOL_MAX_CONNECTIONS = Gauge(
+    "fyyur_db_pool_max_connections",
+    "Connections the pool of one worker may open (pool size plus overflow).",
+    ["database"],
+    multiprocess_mode="livemax",
+)
+CACHE_OPERATIONS = Counter(
+    "fyyur_cache_operations_total",
+    "Page data cache hits, misses, sets and invalidations.",
+    ["operation"],
+)
+
+
+def registry():
+    """The registry to expose: the samples of every worker in multiprocess
+    mode, this process' own otherwise."""
+    if not MULTIPROCESS:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def metrics():
+    return Response(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def _finish_request(response):
+    # the timings and query counts come from instrumentation.py
+    if "request_start" not in g:
+        return response
+
+    method = request.method
+    endpoint = request.endpoint or "<unmatched>"
+    REQUESTS.labels(method, endpoint, str(response.status_code)).inc()
+    REQUEST_SECONDS.labels(method, endpoint).observe(
+        time.perf_counter() - g.request_start
+    )
+    if not response.is_streamed:
+        RESPONSE_BYTES.labels(method, endpoint).observe(
+            response.calculate_content_length() or 0
+        )
+    REQUEST_QUERIES.labels(endpoint).observe(g.query_count)
+    REQUEST_DB_SECONDS.labels(endpoint).observe(g.db_time)
+    return response
+
+
+def _count_cache(sender, stat):
+    CACHE_OPERATIONS.labels(stat).inc()
+
+
+def _watch_pool(engine, database):
+    checked_out = POOL_CHECKED_OUT.labels(database)
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        POOL_MAX_CONNECTIONS.labels(database).set(pool.size() + pool._max_overflow)
+
+    # engine.dispose() (post_fork) keeps the listeners of the replaced pool
+    event.listen(engine, "checkout", lambda *args: checked_out.inc())
+    event.listen(engine, "checkin", lambda *args: checked_out.dec())
+
+
+def init_app(app):
+    """Serve /metrics and record the requests, SQL, pools and cache of `app`;
+    must run after instrumentation.init_app and db.init_app."""
+    _watch_pool(db.get_engine(app), "primary")
+    for bind in app.config["DATABASE_REPLICAS"]:
+        _watch_pool(db.get_engine(app, bind=bind), bind)
+
+    cache_counted.connect(_count_cache)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
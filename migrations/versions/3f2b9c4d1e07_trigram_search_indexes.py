@@ -0,0 +1,35 @@
+"""trigram search indexes.
+
+Revision ID: 3f2b9c4d1e07
+Revises: a8c7dea7e9e3
+Create Date: 2026-10-17 09:12:40.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f2b9c4d1e07"
+down_revision = "a8c7dea7e9e3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The indexed expression must match Venue.search_text / Artist.search_text
+    # in models.py exactly, otherwise the planner will not use the index.
+    # Built concurrently in autocommit mode, like the other listing indexes.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for table in ("venue", "artist"):
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY ix_{table}_search_trgm ON {table} "
+                "USING gin ((name || ' ' || city || ' ' || state) gin_trgm_ops)"
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ("artist", "venue"):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_trgm")
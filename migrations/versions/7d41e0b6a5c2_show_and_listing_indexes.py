@@ -0,0 +1,40 @@
+"""show and listing indexes.
+
+Revision ID: 7d41e0b6a5c2
+Revises: 3f2b9c4d1e07
+Create Date: 2026-10-17 10:03:18.502917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d41e0b6a5c2"
+down_revision = "3f2b9c4d1e07"
+branch_labels = None
+depends_on = None
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so each
+# index is built in autocommit mode and does not lock out writes.
+INDEXES = [
+    ("ix_show_venue_id_start_time", "show", ["venue_id", "start_time"]),
+    ("ix_show_artist_id_start_time", "show", ["artist_id", "start_time"]),
+    ("ix_show_start_time_id", "show", ["start_time", "id"]),
+    ("ix_venue_state_city", "venue", ["state", "city"]),
+    ("ix_venue_name_id", "venue", ["name", "id"]),
+    ("ix_artist_name_id", "artist", ["name", "id"]),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
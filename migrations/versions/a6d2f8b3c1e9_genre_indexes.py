@@ -0,0 +1,43 @@
+"""genre indexes.
+
+Revision ID: a6d2f8b3c1e9
+Revises: f3c8a1e5b7d4
+Create Date: 2026-10-17 16:04:27.551830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6d2f8b3c1e9"
+down_revision = "f3c8a1e5b7d4"
+branch_labels = None
+depends_on = None
+
+# GIN indexes answer genre containment (genres @> ARRAY[...]); the state
+# filter uses the (state, city) btree, which artist did not have yet. Built
+# concurrently in autocommit mode, like the other listing indexes.
+INDEXES = [
+    ("ix_venue_genres", "venue", ["genres"], "gin"),
+    ("ix_artist_genres", "artist", ["genres"], "gin"),
+    ("ix_artist_state_city", "artist", ["state", "city"], "btree"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, using in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_using=using,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, using in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
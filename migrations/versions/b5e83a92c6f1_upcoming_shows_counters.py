@@ -0,0 +1,50 @@
+"""upcoming shows counters.
+
+Revision ID: b5e83a92c6f1
+Revises: 7d41e0b6a5c2
+Create Date: 2026-10-17 10:41:55.260431
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b5e83a92c6f1"
+down_revision = "7d41e0b6a5c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "venue",
+        sa.Column(
+            "upcoming_shows_count", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+    op.add_column(
+        "artist",
+        sa.Column(
+            "upcoming_shows_count", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+
+    # backfill from the (venue_id, start_time) / (artist_id, start_time) indexes
+    op.execute(
+        "UPDATE venue SET upcoming_shows_count = s.num_shows "
+        "FROM (SELECT venue_id, count(*) AS num_shows FROM show "
+        "WHERE start_time > now() GROUP BY venue_id) AS s "
+        "WHERE venue.id = s.venue_id"
+    )
+    op.execute(
+        "UPDATE artist SET upcoming_shows_count = s.num_shows "
+        "FROM (SELECT artist_id, count(*) AS num_shows FROM show "
+        "WHERE start_time > now() GROUP BY artist_id) AS s "
+        "WHERE artist.id = s.artist_id"
+    )
+
+
+def downgrade():
+    op.drop_column("artist", "upcoming_shows_count")
+    op.drop_column("venue", "upcoming_shows_count")
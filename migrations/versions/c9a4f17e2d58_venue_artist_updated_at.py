@@ -0,0 +1,36 @@
+"""venue and artist updated_at.
+
+Revision ID: c9a4f17e2d58
+Revises: b5e83a92c6f1
+Create Date: 2026-10-17 11:26:07.844190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c9a4f17e2d58"
+down_revision = "b5e83a92c6f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "venue",
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+    )
+    op.add_column(
+        "artist",
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column("artist", "updated_at")
+    op.drop_column("venue", "updated_at")
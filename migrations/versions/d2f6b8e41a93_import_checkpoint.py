@@ -0,0 +1,33 @@
+"""import checkpoint.
+
+Revision ID: d2f6b8e41a93
+Revises: c9a4f17e2d58
+Create Date: 2026-10-17 12:18:44.093125
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d2f6b8e41a93"
+down_revision = "c9a4f17e2d58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_checkpoint",
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("records_done", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("source", "kind"),
+    )
+
+
+def downgrade():
+    op.drop_table("import_checkpoint")
@@ -0,0 +1,78 @@
+"""show end time and booking exclusion constraints.
+
+Revision ID: e4b7c1d9a2f6
+Revises: d2f6b8e41a93
+Create Date: 2026-10-17 12:58:21.407516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "e4b7c1d9a2f6"
+down_revision = "d2f6b8e41a93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # integer equality in a GiST exclusion constraint needs btree_gist
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.add_column("show", sa.Column("end_time", sa.DateTime(), nullable=True))
+    # existing shows get the default duration (SHOW_DEFAULT_DURATION_MINUTES)
+    op.execute("UPDATE show SET end_time = start_time + interval '120 minutes'")
+    op.alter_column("show", "end_time", nullable=False)
+    op.create_check_constraint(
+        "ck_show_end_after_start", "show", "end_time > start_time"
+    )
+    op.add_column(
+        "show",
+        sa.Column(
+            "during",
+            postgresql.TSRANGE(),
+            sa.Computed("tsrange(start_time, end_time)"),
+            nullable=True,
+        ),
+    )
+
+    # fail with a readable message rather than a constraint error if the
+    # existing data already double-books someone. In start order, a venue or
+    # artist has overlapping shows exactly when some show starts before the
+    # previous one ends, so one sorted scan per column finds them.
+    bind = op.get_bind()
+    for column in ("venue_id", "artist_id"):
+        conflicts = bind.execute(
+            "SELECT count(*) FROM (SELECT start_time, lag(end_time) OVER "
+            f"(PARTITION BY {column} ORDER BY start_time, id) AS previous_end "
+            "FROM show) s WHERE start_time < previous_end"
+        ).scalar()
+        if conflicts:
+            raise RuntimeError(
+                f"{conflicts} existing shows start before the previous show with "
+                f"the same {column} ends; reschedule them before upgrading"
+            )
+
+    op.create_exclude_constraint(
+        "ex_show_venue_during",
+        "show",
+        ("venue_id", "="),
+        ("during", "&&"),
+        using="gist",
+    )
+    op.create_exclude_constraint(
+        "ex_show_artist_during",
+        "show",
+        ("artist_id", "="),
+        ("during", "&&"),
+        using="gist",
+    )
+
+
+def downgrade():
+    op.drop_constraint("ex_show_artist_during", "show")
+    op.drop_constraint("ex_show_venue_during", "show")
+    op.drop_column("show", "during")
+    op.drop_constraint("ck_show_end_after_start", "show")
+    op.drop_column("show", "end_time")
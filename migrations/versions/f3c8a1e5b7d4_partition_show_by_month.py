@@ -0,0 +1,181 @@
+"""partition show by month.
+
+Revision ID: f3c8a1e5b7d4
+Revises: e4b7c1d9a2f6
+Create Date: 2026-10-17 15:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "f3c8a1e5b7d4"
+down_revision = "e4b7c1d9a2f6"
+branch_labels = None
+depends_on = None
+
+SHOW_INDEXES = [
+    ("ix_show_venue_id_start_time", ["venue_id", "start_time"]),
+    ("ix_show_artist_id_start_time", ["artist_id", "start_time"]),
+    ("ix_show_start_time_id", ["start_time", "id"]),
+]
+
+# Creates the show_pYYYY_MM partition of a month, with the booking exclusion
+# constraints PostgreSQL cannot put on the partitioned table, unless it
+# exists. Used by the app (partitions.py) and the cron command.
+CREATE_PARTITION_FUNCTION = """
+CREATE FUNCTION show_create_partition(for_month date) RETURNS boolean AS $$
+DECLARE
+    first_day date := date_trunc('month', for_month);
+    table_name text := 'show_p' || to_char(first_day, 'YYYY_MM');
+BEGIN
+    -- concurrent bookings may race to create the same month
+    PERFORM pg_advisory_xact_lock(hashtext('show_create_partition'));
+    IF to_regclass(table_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF show FOR VALUES FROM (%L) TO (%L)',
+        table_name, first_day, first_day + interval '1 month'
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+        '(venue_id WITH =, during WITH &&)',
+        table_name, 'ex_' || table_name || '_venue_during'
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+        '(artist_id WITH =, during WITH &&)',
+        table_name, 'ex_' || table_name || '_artist_during'
+    );
+    RETURN true;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def _show_columns():
+    return [
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('show_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("venue_id", sa.Integer(), nullable=False),
+        sa.Column("artist_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=False),
+        sa.Column(
+            "during",
+            postgresql.TSRANGE(),
+            sa.Computed("tsrange(start_time, end_time)"),
+            nullable=True,
+        ),
+        sa.CheckConstraint("end_time > start_time", name="ck_show_end_after_start"),
+        sa.ForeignKeyConstraint(
+            ["artist_id"],
+            ["artist.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["venue_id"],
+            ["venue.id"],
+        ),
+    ]
+
+
+def upgrade():
+    # the unpartitioned table is kept until its rows are copied; its id
+    # sequence moves over to the new table
+    op.execute("ALTER SEQUENCE show_id_seq OWNED BY NONE")
+    op.rename_table("show", "show_unpartitioned")
+    op.execute("ALTER INDEX show_pkey RENAME TO show_unpartitioned_pkey")
+    for name, _ in SHOW_INDEXES:
+        op.drop_index(name, table_name="show_unpartitioned")
+    op.drop_constraint("ex_show_artist_during", "show_unpartitioned")
+    op.drop_constraint("ex_show_venue_during", "show_unpartitioned")
+
+    # the primary key of a partitioned table must include the partition key
+    op.create_table(
+        "show",
+        *_show_columns(),
+        sa.PrimaryKeyConstraint("id", "start_time"),
+        postgresql_partition_by="RANGE (start_time)"
+    )
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, "show", columns, unique=False)
+    op.execute(CREATE_PARTITION_FUNCTION)
+
+    # partitions for every month with shows, and for the next year
+    # (SHOW_PARTITION_MONTHS_AHEAD)
+    op.execute(
+        "SELECT show_create_partition(month::date) FROM generate_series("
+        "(SELECT date_trunc('month', least(min(start_time), now())) FROM show_unpartitioned), "
+        "(SELECT date_trunc('month', greatest(max(start_time), now() + interval '12 months')) "
+        "FROM show_unpartitioned), "
+        "interval '1 month') AS month"
+    )
+    op.execute(
+        "INSERT INTO show (id, venue_id, artist_id, start_time, end_time) "
+        "SELECT id, venue_id, artist_id, start_time, end_time FROM show_unpartitioned"
+    )
+    op.drop_table("show_unpartitioned")
+    op.execute("ALTER SEQUENCE show_id_seq OWNED BY show.id")
+
+    op.create_table(
+        "show_summary",
+        sa.Column("venue_id", sa.Integer(), nullable=False),
+        sa.Column("artist_id", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("shows_count", sa.Integer(), nullable=False),
+        sa.Column("first_start_time", sa.DateTime(), nullable=False),
+        sa.Column("last_start_time", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["artist_id"], ["artist.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["venue_id"], ["venue.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("venue_id", "artist_id", "month"),
+    )
+    op.create_index(
+        "ix_show_summary_artist_id", "show_summary", ["artist_id"], unique=False
+    )
+
+
+def downgrade():
+    # shows of archived months are not brought back: they only live on in
+    # the detached show_archived_YYYY_MM tables
+    op.drop_index("ix_show_summary_artist_id", table_name="show_summary")
+    op.drop_table("show_summary")
+
+    op.create_table(
+        "show_unpartitioned",
+        *_show_columns(),
+        sa.PrimaryKeyConstraint("id", name="show_unpartitioned_pkey")
+    )
+    op.execute(
+        "INSERT INTO show_unpartitioned (id, venue_id, artist_id, start_time, end_time) "
+        "SELECT id, venue_id, artist_id, start_time, end_time FROM show"
+    )
+    op.execute("ALTER SEQUENCE show_id_seq OWNED BY NONE")
+    op.drop_table("show")
+    op.execute("DROP FUNCTION show_create_partition(date)")
+
+    op.rename_table("show_unpartitioned", "show")
+    op.execute("ALTER INDEX show_unpartitioned_pkey RENAME TO show_pkey")
+    op.execute("ALTER SEQUENCE show_id_seq OWNED BY show.id")
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, "show", columns, unique=False)
+    op.create_exclude_constraint(
+        "ex_show_venue_during",
+        "show",
+        ("venue_id", "="),
+        ("during", "&&"),
+        using="gist",
+    )
+    op.create_exclude_constraint(
+        "ex_show_artist_during",
+        "show",
+        ("artist_id", "="),
+        ("during", "&&"),
+        using="gist",
+    )
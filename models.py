@@ -2,16 +2,29 @@
 # Models.
 # ----------------------------------------------------------------------------#
 
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from collections import Counter
+from datetime import datetime
 
+from sqlalchemy import bindparam, case, event, func, inspect, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION, TSRANGE
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Query, raiseload
 
-# Create an empty SQLAlchemy object
-db = SQLAlchemy()
+from routing import RoutingSQLAlchemy
+
+
+# Create an empty SQLAlchemy object; reads may be routed to replicas
+db = RoutingSQLAlchemy()
 
 
 class Venue(db.Model):
     __tablename__ = "venue"
+    __table_args__ = (
+        db.Index("ix_venue_state_city", "state", "city"),
+        db.Index("ix_venue_name_id", "name", "id"),
+        # genre containment filters, see filter_catalog()
+        db.Index("ix_venue_genres", "genres", postgresql_using="gin"),
+    )
 
     id = db.Column(
         db.Integer,
@@ -29,13 +42,31 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(ARRAY(db.String))
+    # maintained by the show write paths, see record_shows_added()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default="0")
+    # bumped on edits and whenever a show of this row changes (conditional GETs)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now()
+    )
 
     # genres = db.relationship(
     #    "Genre", secondary="venue_genre", backref="venues", lazy="joined"
     # )
 
-    shows = db.relationship("Show", backref="venue", lazy="joined", cascade='all, delete')
+    # loaded on demand; routes pick a loader option per query (see
+    # guard_lazy_loads() for catching unplanned lazy loads)
+    shows = db.relationship(
+        "Show",
+        backref=db.backref("venue", lazy="select"),
+        lazy="select",
+        cascade="all, delete",
+    )
+
+    # covered by the ix_venue_search_trgm GIN index (pg_trgm)
+    @hybrid_property
+    def search_text(self):
+        return self.name + " " + self.city + " " + self.state
 
     def __repr__(self):
         return f"<Venue {self.id} {self.name} {self.city} {self.state} {self.address} {self.phone} {self.image_link} {self.facebook_link} {self.website} {self.seeking_talent} {self.seeking_description}>"
@@ -43,6 +74,12 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = "artist"
+    __table_args__ = (
+        db.Index("ix_artist_name_id", "name", "id"),
+        db.Index("ix_artist_state_city", "state", "city"),
+        # genre containment filters, see filter_catalog()
+        db.Index("ix_artist_genres", "genres", postgresql_using="gin"),
+    )
 
     id = db.Column(
         db.Integer,
@@ -59,9 +96,25 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(ARRAY(db.String))
+    # maintained by the show write paths, see record_shows_added()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default="0")
+    # bumped on edits and whenever a show of this row changes (conditional GETs)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now()
+    )
 
-    shows = db.relationship("Show", backref="artist", lazy="joined", cascade='all, delete')
+    shows = db.relationship(
+        "Show",
+        backref=db.backref("artist", lazy="select"),
+        lazy="select",
+        cascade="all, delete",
+    )
+
+    # covered by the ix_artist_search_trgm GIN index (pg_trgm)
+    @hybrid_property
+    def search_text(self):
+        return self.name + " " + self.city + " " + self.state
 
     def __repr__(self):
         return f"<Artist {self.id} {self.name} {self.city} {self.state} {self.phone} {self.image_link} {self.facebook_link} {self.website} {self.seeking_venue} {self.seeking_description}>"
@@ -71,14 +124,368 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = "show"
+    __table_args__ = (
+        db.Index("ix_show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_show_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_show_start_time_id", "start_time", "id"),
+        # no venue or artist is booked twice at the same time: the
+        # ex_<partition>_venue_during / _artist_during exclusion constraints
+        # (btree_gist) are added to each partition by show_create_partition(),
+        # their GiST indexes also serve find_conflicts()
+        db.CheckConstraint("end_time > start_time", name="ck_show_end_after_start"),
+        # one partition per month, see partitions.py
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
+    # ids come from show_id_seq; the primary key has to include the
+    # partition key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("venue.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False, primary_key=False)
+    start_time = db.Column(db.DateTime, nullable=False, primary_key=True)
+    end_time = db.Column(db.DateTime, nullable=False)
+    # [start_time, end_time), computed by PostgreSQL
+    during = db.Column(TSRANGE, db.Computed("tsrange(start_time, end_time)"))
 
     def __repr__(self):
         return f"<Show {self.id} {self.venue_id} {self.artist_id} {self.start_time}>"
 
 
+class ShowSummary(db.Model):
+    """Shows of a venue and artist in a month whose partition was archived
+    (see partitions.py); past show counts add these up."""
+
+    __tablename__ = "show_summary"
+    __table_args__ = (db.Index("ix_show_summary_artist_id", "artist_id"),)
+
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey("venue.id", ondelete="CASCADE"), primary_key=True
+    )
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey("artist.id", ondelete="CASCADE"), primary_key=True
+    )
+    month = db.Column(db.Date, primary_key=True)
+    shows_count = db.Column(db.Integer, nullable=False)
+    first_start_time = db.Column(db.DateTime, nullable=False)
+    last_start_time = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ShowSummary {self.venue_id} {self.artist_id} {self.month} {self.shows_count}>"
+
+
 # DONE! Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+
+
+class ImportCheckpoint(db.Model):
+    """Progress of a bulk import (see bulk_import.py), committed with each
+    batch so an interrupted import resumes where it stopped."""
+
+    __tablename__ = "import_checkpoint"
+
+    source = db.Column(db.String, primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)
+    records_done = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ImportCheckpoint {self.kind} {self.source} {self.records_done}>"
+
+
+# ----------------------------------------------------------------------------#
+# Shared queries.
+# ----------------------------------------------------------------------------#
+
+
+def _contains(search_term):
+    # ilike pattern matching search_term anywhere, taken literally
+    pattern = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{pattern}%"
+
+
+def search_query(model, search_term, columns, limit, **filters):
+    """Rank `model` rows whose search_text contains `search_term`.
+
+    The ilike on search_text is served by the pg_trgm GIN index, results are
+    ordered by trigram similarity and capped at `limit`. `filters` are
+    passed on to filter_catalog().
+    """
+    search_term = search_term.strip()
+    query = _search_matches(model, search_term, columns, filters)
+    if not search_term:
+        return query.order_by(model.name, model.id).limit(limit)
+
+    return query.order_by(
+        func.similarity(model.search_text, search_term).desc(),
+        model.name,
+        model.id,
+    ).limit(limit)
+
+
+def search_keyset(model, search_term, columns, **filters):
+    """The matches of search_query() and their keyset for keyset_page():
+    (similarity, id), best match first, or (name, id) for an empty term.
+
+    Returns (query, keyset columns, descending); the similarity is added to
+    the rows as `similarity`.
+    """
+    search_term = search_term.strip()
+    query = _search_matches(model, search_term, columns, filters)
+    if not search_term:
+        return query, (model.name, model.id), False
+
+    # similarity() is a real; as a double it survives the JSON cursor exactly
+    # and compares equal to itself on the next page
+    rank = func.similarity(model.search_text, search_term)
+    similarity = db.cast(rank, DOUBLE_PRECISION).label("similarity")
+    return query.add_columns(similarity), (similarity, model.id), True
+
+
+def _search_matches(model, search_term, columns, filters):
+    query = filter_catalog(db.session.query(*columns), model, **filters)
+    if search_term:
+        query = query.filter(model.search_text.ilike(_contains(search_term)))
+    return query
+
+
+def seeking_flag(model):
+    """Venue.seeking_talent or Artist.seeking_venue."""
+    return model.seeking_talent if model is Venue else model.seeking_venue
+
+
+def filter_catalog(query, model, genres=(), state=None, city=None, seeking=None):
+    """Restrict a venue/artist query to rows having every one of `genres`,
+    in `state` and `city`, and seeking or not if `seeking` is a bool.
+
+    Genre containment (@>) is answered by the GIN index on genres and the
+    state by the (state, city) index; together they are combined in a
+    bitmap scan instead of reading the whole table.
+    """
+    if genres:
+        query = query.filter(model.genres.contains(list(genres)))
+    if state:
+        query = query.filter(model.state == state)
+    if city:
+        query = query.filter(model.city == city)
+    if seeking is not None:
+        query = query.filter(seeking_flag(model).is_(seeking))
+    return query
+
+
+# GROUPING(state, city, genre, seeking) of each grouping set of
+# facet_counts(): one bit per column aggregated away, the first one highest
+FACET_GROUPINGS = {
+    0b1111: "total",
+    0b0111: "state",
+    0b0011: "city",
+    0b1101: "genre",
+    0b1110: "seeking",
+}
+
+
+def facet_counts(model, search_term, **filters):
+    """Counts of the `model` rows matching a search, overall and per state,
+    city, genre and seeking flag, in one query.
+
+    Each matching row is expanded to one row per genre (a single NULL genre
+    when it has none), grouped by GROUPING SETS and counted by distinct id.
+    Returns {"total": n, "state": {state: n}, "city": {(state, city): n},
+    "genre": {genre: n}, "seeking": {flag: n}}.
+    """
+    genres = case(
+        [(func.cardinality(model.genres) > 0, model.genres)],
+        else_=literal_column("ARRAY[NULL]::varchar[]"),
+    )
+    matches = filter_catalog(
+        db.session.query(
+            model.id,
+            model.state,
+            model.city,
+            func.unnest(genres).label("genre"),
+            seeking_flag(model).label("seeking"),
+        ),
+        model,
+        **filters,
+    )
+    search_term = search_term.strip()
+    if search_term:
+        matches = matches.filter(model.search_text.ilike(_contains(search_term)))
+    matches = matches.subquery()
+
+    columns = (matches.c.state, matches.c.city, matches.c.genre, matches.c.seeking)
+    rows = db.session.query(
+        *columns,
+        func.count(matches.c.id.distinct()).label("count"),
+        func.grouping(*columns).label("grouping_set"),
+    ).group_by(
+        func.grouping_sets(
+            tuple_(),
+            tuple_(matches.c.state),
+            tuple_(matches.c.state, matches.c.city),
+            tuple_(matches.c.genre),
+            tuple_(matches.c.seeking),
+        )
+    )
+
+    facets = {"total": 0, "state": {}, "city": {}, "genre": {}, "seeking": {}}
+    for row in rows:
+        facet = FACET_GROUPINGS[row.grouping_set]
+        if facet == "total":
+            facets["total"] = row.count
+        elif facet == "city":
+            facets["city"][(row.state, row.city)] = row.count
+        elif getattr(row, facet) is not None:
+            # rows without genres or without a seeking flag are left out
+            facets[facet][getattr(row, facet)] = row.count
+    return facets
+
+
+def show_counts(foreign_key, entity_id):
+    """Past and upcoming show counts for one venue/artist in a single query.
+
+    The past count includes the archived shows, also given on their own as
+    archived_shows_count.
+    """
+    now = func.now()
+    archived = (
+        db.select([func.coalesce(func.sum(ShowSummary.shows_count), 0)])
+        .where(getattr(ShowSummary, foreign_key.key) == entity_id)
+        .as_scalar()
+    )
+    return (
+        db.session.query(
+            (func.count(Show.id).filter(Show.start_time <= now) + archived).label(
+                "past_shows_count"
+            ),
+            func.count(Show.id)
+            .filter(Show.start_time > now)
+            .label("upcoming_shows_count"),
+            archived.label("archived_shows_count"),
+        )
+        .filter(foreign_key == entity_id)
+        .one()
+    )
+
+
+# ----------------------------------------------------------------------------#
+# Upcoming show counters.
+# ----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count and Artist.upcoming_shows_count are kept up to
+# date by the write handlers, so listings never aggregate the show table. Shows
+# that slip into the past are aged out by recompute_upcoming_shows_counts(),
+# run periodically with `flask recompute-upcoming-counts`. The same statements
+# bump updated_at, which the conditional GET validators are computed from.
+
+
+def record_shows_added(shows):
+    """Bump updated_at, and the upcoming counters for future shows, of the
+    venues and artists of new shows (objects with venue_id, artist_id and
+    start_time): one executemany UPDATE per table."""
+    now = datetime.now()
+    for model, key in ((Venue, "venue_id"), (Artist, "artist_id")):
+        deltas = Counter()
+        for show in shows:
+            deltas[getattr(show, key)] += 1 if show.start_time > now else 0
+        if not deltas:
+            continue
+        db.session.execute(
+            model.__table__.update()
+            .where(model.id == bindparam("entity_id"))
+            .values(
+                upcoming_shows_count=model.upcoming_shows_count + bindparam("delta"),
+                updated_at=func.now(),
+            ),
+            [
+                {"entity_id": entity_id, "delta": delta}
+                for entity_id, delta in deltas.items()
+            ],
+        )
+
+
+def release_venue_shows(venue_id):
+    """Update the artists of a venue being deleted: decrement their upcoming
+    counters and bump updated_at, since their show lists change."""
+    counts = (
+        db.session.query(
+            Show.artist_id,
+            func.count(Show.id)
+            .filter(Show.start_time > func.now())
+            .label("num_upcoming_shows"),
+        )
+        .filter(Show.venue_id == venue_id)
+        .group_by(Show.artist_id)
+        .subquery()
+    )
+    db.session.execute(
+        Artist.__table__.update()
+        .where(Artist.id == counts.c.artist_id)
+        .values(
+            upcoming_shows_count=Artist.upcoming_shows_count
+            - counts.c.num_upcoming_shows,
+            updated_at=func.now(),
+        )
+    )
+
+
+def touch_show_partners(model, entity_id):
+    """Bump updated_at of the artists playing at a venue, or of the venues an
+    artist plays at, after that venue/artist changed what their pages show."""
+    if model is Venue:
+        partner, own_key, partner_key = Artist, Show.venue_id, Show.artist_id
+    else:
+        partner, own_key, partner_key = Venue, Show.artist_id, Show.venue_id
+    partner_ids = db.select([partner_key]).where(own_key == entity_id)
+    db.session.execute(
+        partner.__table__.update()
+        .where(partner.id.in_(partner_ids))
+        .values(updated_at=func.now())
+    )
+
+
+def recompute_upcoming_shows_counts():
+    """Recompute every counter from the show table, touching only stale rows.
+
+    Returns the number of venue and artist rows that changed.
+    """
+    changed = 0
+    for model, foreign_key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        actual = (
+            db.select([func.count(Show.id)])
+            .where(foreign_key == model.id)
+            .where(Show.start_time > func.now())
+            .as_scalar()
+        )
+        result = db.session.execute(
+            model.__table__.update()
+            .where(model.upcoming_shows_count != actual)
+            .values(upcoming_shows_count=actual, updated_at=func.now())
+        )
+        changed += result.rowcount
+    db.session.commit()
+    return changed
+
+
+# ----------------------------------------------------------------------------#
+# Lazy load guard.
+# ----------------------------------------------------------------------------#
+
+
+def _raise_on_lazy_load(query):
+    # column-only queries have no relationships to guard
+    for entity in query.column_descriptions:
+        info = inspect(entity["expr"], raiseerr=False)
+        if getattr(info, "is_mapper", False) or getattr(
+            info, "is_aliased_class", False
+        ):
+            return query.options(raiseload("*"))
+    return query
+
+
+def guard_lazy_loads():
+    """Make entity queries raise on any relationship lazy load that is not
+    covered by an explicit loader option (selectinload, noload, ...).
+
+    Enabled with SQLALCHEMY_RAISE_ON_LAZY_LOAD, for tests and development.
+    """
+    if not event.contains(Query, "before_compile", _raise_on_lazy_load):
+        event.listen(Query, "before_compile", _raise_on_lazy_load, retval=True)
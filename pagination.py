@@ -0,0 +1,123 @@
+# ----------------------------------------------------------------------------#
+# Keyset (cursor) pagination.
+# ----------------------------------------------------------------------------#
+
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import DateTime, tuple_
+
+
+def encode_cursor(values):
+    """Encode the sort key of a row as an opaque, url-safe cursor."""
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_value(column, value):
+    """Check a cursor value against the Python type of its keyset column, so
+    a forged cursor fails here and not in PostgreSQL."""
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise TypeError("cursor time is not an ISO 8601 string")
+        return datetime.fromisoformat(value)
+    python_type = column.type.python_type
+    if python_type is float and type(value) is int:
+        return float(value)
+    # type(), not isinstance(): JSON true/false must not pass for an id
+    if type(value) is not python_type:
+        raise TypeError(f"cursor value is not a {python_type.__name__}")
+    return value
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor produced by encode_cursor back into column values.
+
+    Aborts with 400 if the cursor is malformed or does not match the keyset.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError("cursor does not match keyset")
+        return tuple(
+            _decode_value(column, value) for column, value in zip(columns, payload)
+        )
+    except (ValueError, TypeError):
+        abort(400, "Invalid pagination cursor.")
+
+
+def page_size():
+    """Requested page size, defaulting to PAGE_SIZE and capped at MAX_PAGE_SIZE."""
+    per_page = request.args.get("per_page", type=int) or current_app.config["PAGE_SIZE"]
+    return max(1, min(per_page, current_app.config["MAX_PAGE_SIZE"]))
+
+
+def _row_key(row, columns):
+    return tuple(getattr(row, column.key) for column in columns)
+
+
+def _page_url(arg_prefix, **cursor):
+    args = request.args.to_dict()
+    args.pop(arg_prefix + "after", None)
+    args.pop(arg_prefix + "before", None)
+    args.update({arg_prefix + name: value for name, value in cursor.items()})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def keyset_page(query, columns, descending=False, per_page=None, arg_prefix=""):
+    """Fetch one page of `query` ordered by the `columns` keyset.
+
+    The cursor is read from the `after`/`before` request arguments and the
+    query is bounded to `per_page + 1` rows, so every page costs one index
+    range scan no matter how deep the user has paged. Rows must expose each
+    keyset column under its column key (label projections accordingly).
+    Use `arg_prefix` to page several lists independently on the same page.
+    """
+    per_page = per_page or page_size()
+    after = request.args.get(arg_prefix + "after")
+    before = request.args.get(arg_prefix + "before")
+    key = tuple_(*columns)
+
+    # Paging backwards walks the index in the opposite direction and flips
+    # the rows afterwards.
+    backwards = before is not None and after is None
+    reverse = descending != backwards
+    if after is not None:
+        bound = decode_cursor(after, columns)
+        query = query.filter(key < bound if descending else key > bound)
+    elif backwards:
+        bound = decode_cursor(before, columns)
+        query = query.filter(key > bound if descending else key < bound)
+
+    order = [column.desc() if reverse else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+
+    next_cursor = (
+        encode_cursor(_row_key(rows[-1], columns)) if rows and has_next else None
+    )
+    prev_cursor = (
+        encode_cursor(_row_key(rows[0], columns)) if rows and has_prev else None
+    )
+
+    return {
+        "items": rows,
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "next_url": _page_url(arg_prefix, after=next_cursor) if next_cursor else None,
+        "prev_url": _page_url(arg_prefix, before=prev_cursor) if prev_cursor else None,
+    }
@@ -0,0 +1,166 @@
+# ----------------------------------------------------------------------------#
+# Monthly partitions of the show table and archival of old months.
+# ----------------------------------------------------------------------------#
+
+# show is range-partitioned on start_time, one show_pYYYY_MM partition per
+# month, so queries split on now() or bounded by date only scan the months
+# they need. Partitions are created ahead of time by
+# `flask create-show-partitions` and on demand by the write paths, both
+# through the show_create_partition() SQL function, which also adds the
+# per-partition booking exclusion constraints (PostgreSQL cannot enforce
+# them on the partitioned table itself).
+#
+# `flask archive-shows` folds old months into show_summary (shows per venue,
+# artist and month, which the past show counts include) and detaches them.
+
+import re
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import text
+
+from models import db, Artist, Venue
+
+PARTITION_NAME = re.compile(r"^show_p(\d{4})_(\d{2})$")
+
+# Shows per venue, artist and month of a partition, added to what earlier
+# runs summarized for the same month.
+SUMMARIZE_SQL = """
+    INSERT INTO show_summary
+        (venue_id, artist_id, month, shows_count, first_start_time, last_start_time)
+    SELECT venue_id, artist_id, date_trunc('month', start_time), count(*),
+           min(start_time), max(start_time)
+    FROM "{partition}"
+    GROUP BY venue_id, artist_id, date_trunc('month', start_time)
+    ON CONFLICT (venue_id, artist_id, month) DO UPDATE SET
+        shows_count = show_summary.shows_count + EXCLUDED.shows_count,
+        first_start_time = least(show_summary.first_start_time, EXCLUDED.first_start_time),
+        last_start_time = greatest(show_summary.last_start_time, EXCLUDED.last_start_time)
+"""
+
+# months this process already made sure have a partition
+_ensured = set()
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(moments):
+    """Create the missing partitions for the months of `moments`; returns
+    how many were created.
+
+    Runs on a connection of its own and commits at once, since creating a
+    partition locks the whole show table. Call it before the session reads
+    the show table: a session holding a lock on it would wait on itself.
+    """
+    months = {month_start(moment) for moment in moments} - _ensured
+    if not months:
+        return 0
+    created = 0
+    with db.get_engine(current_app).begin() as connection:
+        for month in sorted(months):
+            created += connection.execute(
+                text("SELECT show_create_partition(:month)"), month=month
+            ).scalar()
+    _ensured.update(months)
+    return created
+
+
+def create_future_partitions(months_ahead=None):
+    """Partitions from this month to SHOW_PARTITION_MONTHS_AHEAD months on."""
+    if months_ahead is None:
+        months_ahead = current_app.config["SHOW_PARTITION_MONTHS_AHEAD"]
+    this_month = month_start(datetime.now())
+    return ensure_partitions(
+        add_months(this_month, months) for months in range(months_ahead + 1)
+    )
+
+
+def partitions():
+    """(month, table name) of the attached show partitions, oldest first."""
+    rows = db.session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'show'::regclass"
+        )
+    )
+    found = []
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            found.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(found)
+
+
+def archive_partitions(before=None, drop=False, report=print):
+    """Summarize and detach the partitions of the months that ended by
+    `before` (default SHOW_ARCHIVE_AFTER_MONTHS ago), one transaction each.
+
+    Detached partitions are kept as show_archived_YYYY_MM tables, for a
+    dump or ad hoc queries, unless `drop` is set. Returns their names.
+    """
+    if before is None:
+        months = current_app.config["SHOW_ARCHIVE_AFTER_MONTHS"]
+        before = add_months(month_start(datetime.now()), -months)
+    else:
+        before = min(
+            before.date() if isinstance(before, datetime) else before, date.today()
+        )
+
+    archived = []
+    for month, name in partitions():
+        if add_months(month, 1) > before:
+            break
+        try:
+            db.session.execute(text(SUMMARIZE_SQL.format(partition=name)))
+            # their pages no longer list these shows
+            for model, key in ((Venue, "venue_id"), (Artist, "artist_id")):
+                db.session.execute(
+                    text(
+                        f'UPDATE "{model.__tablename__}" SET updated_at = now() '
+                        f'WHERE id IN (SELECT {key} FROM "{name}")'
+                    )
+                )
+            db.session.execute(text(f'ALTER TABLE show DETACH PARTITION "{name}"'))
+            if drop:
+                db.session.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                # history is not booked any more, which also frees the names
+                # for a partition recreated for the same month; the foreign
+                # keys would keep venues and artists with archived shows
+                # from being deleted (show_summary cascades instead)
+                constraints = [f"ex_{name}_venue_during", f"ex_{name}_artist_during"]
+                constraints += [
+                    conname
+                    for (conname,) in db.session.execute(
+                        text(
+                            "SELECT conname FROM pg_constraint "
+                            "WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+                        ),
+                        {"name": name},
+                    )
+                ]
+                drops = ", ".join(
+                    f'DROP CONSTRAINT "{conname}"' for conname in constraints
+                )
+                db.session.execute(text(f'ALTER TABLE "{name}" {drops}'))
+                db.session.execute(
+                    text(
+                        f'ALTER TABLE "{name}" RENAME TO "show_archived_{month:%Y_%m}"'
+                    )
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        _ensured.discard(month)
+        report(f"Archived {name}.")
+        archived.append(name)
+    return archived
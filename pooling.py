@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------#
+# Database connection pool settings and statistics.
+# ----------------------------------------------------------------------------#
+
+import bisect
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket
+# counts everything slower.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection.
+
+    Statistics are per pool and therefore per worker process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self._record_wait((time.perf_counter() - started) * 1000)
+
+    def _record_wait(self, wait_ms):
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            histogram = {
+                f"le_{bound}ms": count
+                for bound, count in zip(WAIT_BUCKETS_MS, self.wait_counts)
+            }
+            histogram[f"gt_{WAIT_BUCKETS_MS[-1]}ms"] = self.wait_counts[-1]
+            return {
+                "pool_size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3)
+                if self.checkouts
+                else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "wait_histogram": histogram,
+            }
+
+
+def engine_options(config):
+    """SQLAlchemy engine options for the DATABASE_POOL_* settings.
+
+    In "pgbouncer" mode connections are opened per checkout and closed on
+    return (NullPool): PgBouncer in transaction pooling mode does the pooling
+    and hands each transaction a possibly different server connection, so
+    the app must not keep idle connections or rely on session state.
+    """
+    mode = config["DATABASE_POOL_MODE"]
+    if mode == "pgbouncer":
+        return {"poolclass": NullPool}
+    if mode != "pool":
+        raise ValueError(f"Unknown DATABASE_POOL_MODE: {mode!r}")
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config["DATABASE_POOL_SIZE"],
+        "max_overflow": config["DATABASE_MAX_OVERFLOW"],
+        "pool_timeout": config["DATABASE_POOL_TIMEOUT"],
+        "pool_recycle": config["DATABASE_POOL_RECYCLE"],
+        "pool_pre_ping": config["DATABASE_POOL_PRE_PING"],
+    }
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.stats())
+    return stats
+
+
+def init_app(app):
+    """Derive SQLALCHEMY_ENGINE_OPTIONS from the DATABASE_POOL_* settings;
+    must run before the engine is first used."""
+    app.config.setdefault("DATABASE_POOL_MODE", "pool")
+    app.config.setdefault("DATABASE_POOL_SIZE", 4)
+    app.config.setdefault("DATABASE_MAX_OVERFLOW", 1)
+    app.config.setdefault("DATABASE_POOL_TIMEOUT", 10)
+    app.config.setdefault("DATABASE_POOL_RECYCLE", 1800)
+    app.config.setdefault("DATABASE_POOL_PRE_PING", True)
+
+    options = engine_options(app.config)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
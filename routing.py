@@ -0,0 +1,98 @@
+# ----------------------------------------------------------------------------#
+# Read-replica routing.
+# ----------------------------------------------------------------------------#
+
+import random
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+
+# Cookie marking a client that wrote recently; its reads stay on the primary
+# until the replicas have caught up.
+PIN_COOKIE = "fyyur_primary"
+
+
+def read_only(view):
+    """Mark a non-GET view (e.g. a POST search form) as safe for a replica."""
+    view.replica_reads = True
+    return view
+
+
+class RoutingSession(SignallingSession):
+    """Session sending the reads of a replica-routed request to its replica.
+
+    Flushes, DML statements and everything after them in the same request go
+    to the primary; so does everything outside a request (CLI, migrations).
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if not has_request_context():
+            return super().get_bind(mapper, clause)
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            # read-your-writes for the rest of this request and the next ones
+            g.db_replica = None
+            g.db_wrote = True
+        replica = g.get("db_replica")
+        if replica is None:
+            return super().get_bind(mapper, clause)
+        return get_state(self.app).db.get_engine(self.app, bind=replica)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def replica_binds(app):
+    return [
+        key
+        for key in app.config.get("SQLALCHEMY_BINDS") or {}
+        if key.startswith("replica")
+    ]
+
+
+def _choose_replica():
+    replicas = current_app.config["DATABASE_REPLICAS"]
+    if not replicas or request.cookies.get(PIN_COOKIE):
+        return None
+    view = current_app.view_functions.get(request.endpoint)
+    if request.method in ("GET", "HEAD") or getattr(view, "replica_reads", False):
+        return random.choice(replicas)
+    return None
+
+
+def _start_request():
+    g.db_replica = _choose_replica()
+    g.db_wrote = False
+
+
+def _pin_writer(response):
+    if g.get("db_wrote"):
+        pin_seconds = current_app.config["DATABASE_REPLICA_PIN_SECONDS"]
+        response.set_cookie(
+            PIN_COOKIE,
+            str(int(time.time())),
+            max_age=pin_seconds,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def init_app(app):
+    """Register REPLICA_DATABASE_URLS as the binds replica_0, replica_1, ...
+    and route read-only requests to one of them."""
+    app.config.setdefault("REPLICA_DATABASE_URLS", [])
+    app.config.setdefault("DATABASE_REPLICA_PIN_SECONDS", 10)
+
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for index, url in enumerate(app.config["REPLICA_DATABASE_URLS"]):
+        binds.setdefault(f"replica_{index}", url)
+    app.config["SQLALCHEMY_BINDS"] = binds or None
+    app.config["DATABASE_REPLICAS"] = replica_binds(app)
+
+    app.before_request(_start_request)
+    app.after_request(_pin_writer)
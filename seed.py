@@ -1,14 +1,17 @@
+import dateutil.parser
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from models import db, Venue, Artist, Show
 from app import app
+from booking import default_duration
+from partitions import ensure_partitions
 
-#app = Flask(__name__)
-#app.config.from_object("config")
-#db.init_app(app)
+# app = Flask(__name__)
+# app.config.from_object("config")
+# db.init_app(app)
 
 with app.app_context():
-    try: 
+    try:
         Artist.query.delete()
         Venue.query.delete()
         Show.query.delete()
@@ -16,7 +19,7 @@ with app.app_context():
 
         artists = [
             {
-                #"id": 1,
+                # "id": 1,
                 "name": "Guns N Petals",
                 "genres": ["Rock n Roll"],
                 "city": "San Francisco",
@@ -40,7 +43,7 @@ with app.app_context():
                 "upcoming_shows_count": 0,
             },
             {
-                #"id": 2,
+                # "id": 2,
                 "name": "Matt Quevedo",
                 "genres": ["Jazz"],
                 "city": "New York",
@@ -62,7 +65,7 @@ with app.app_context():
                 "upcoming_shows_count": 0,
             },
             {
-                #"id": 3,
+                # "id": 3,
                 "name": "The Wild Sax Band",
                 "genres": ["Jazz", "Classical"],
                 "city": "San Francisco",
@@ -108,7 +111,7 @@ with app.app_context():
 
         venues = [
             {
-                #"id": 1,
+                # "id": 1,
                 "name": "The Musical Hop",
                 "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
                 "address": "1015 Folsom Street",
@@ -133,7 +136,7 @@ with app.app_context():
                 "upcoming_shows_count": 0,
             },
             {
-                #"id": 2,
+                # "id": 2,
                 "name": "The Dueling Pianos Bar",
                 "genres": ["Classical", "R&B", "Hip-Hop"],
                 "address": "335 Delancey Street",
@@ -150,7 +153,7 @@ with app.app_context():
                 "upcoming_shows_count": 0,
             },
             {
-                #"id": 3,
+                # "id": 3,
                 "name": "Park Square Live Music & Coffee",
                 "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
                 "address": "34 Whiskey Moore Ave",
@@ -248,11 +251,15 @@ with app.app_context():
         ]
 
         print("inserting shows...")
+        ensure_partitions(dateutil.parser.parse(s["start_time"]) for s in shows)
         for s in shows:
             new_show = Show()
             new_show.venue_id = s["venue_id"]
             new_show.artist_id = s["artist_id"]
             new_show.start_time = s["start_time"]
+            new_show.end_time = (
+                dateutil.parser.parse(s["start_time"]) + default_duration()
+            )
             db.session.add(new_show)
             print("Adding ", new_show)
 
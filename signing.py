@@ -0,0 +1,36 @@
+# ----------------------------------------------------------------------------#
+# Session and CSRF signing with rotatable keys.
+# ----------------------------------------------------------------------------#
+
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
+
+
+def verification_keys(app):
+    """SECRET_KEYS in itsdangerous order: oldest first, the signing key last."""
+    keys = app.config.get("SECRET_KEYS") or [app.secret_key]
+    return list(reversed(keys))
+
+
+class RotatingSessionInterface(SecureCookieSessionInterface):
+    """Cookie sessions signed with the newest key and accepted under any key
+    still listed in SECRET_KEYS, so rotating keys does not log everyone out."""
+
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        signer_kwargs = dict(
+            key_derivation=self.key_derivation, digest_method=self.digest_method
+        )
+        return URLSafeTimedSerializer(
+            verification_keys(app),
+            salt=self.salt,
+            serializer=self.serializer,
+            signer_kwargs=signer_kwargs,
+        )
+
+
+def init_app(app):
+    app.session_interface = RotatingSessionInterface()
+    # Flask-WTF hands the key straight to itsdangerous, which accepts a list
+    app.config.setdefault("WTF_CSRF_SECRET_KEY", verification_keys(app))
@@ -2,3 +2,32 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead for the navbar search boxes, answered by /search/suggest.
+document.querySelectorAll("input[data-suggest-type]").forEach(function (input) {
+  var list = document.getElementById(input.getAttribute("list"));
+  var timer = null;
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      var query = input.value.trim();
+      if (!query) {
+        list.innerHTML = "";
+        return;
+      }
+      var url = "/search/suggest?type=" + input.dataset.suggestType +
+        "&q=" + encodeURIComponent(query);
+      fetch(url)
+        .then(function (response) { return response.json(); })
+        .then(function (results) {
+          list.innerHTML = "";
+          results.data.forEach(function (result) {
+            var option = document.createElement("option");
+            option.value = result.name;
+            option.label = result.city + ", " + result.state;
+            list.appendChild(option);
+          });
+        });
+    }, 100);
+  });
+});
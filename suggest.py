@@ -0,0 +1,286 @@
+# ----------------------------------------------------------------------------#
+# In-process typeahead index over venue and artist names and places.
+# ----------------------------------------------------------------------------#
+
+import bisect
+import math
+import re
+import threading
+import time
+
+from sqlalchemy import literal, select, union_all
+
+from models import db, Artist, Venue
+
+# Entries looked at per prefix lookup before giving up on more matches,
+# bounds the cost of one-letter prefixes.
+MAX_SCAN = 2000
+# Trigram similarity a word needs to stand in for a misspelt query word
+# (pg_trgm's default threshold).
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"\w+")
+
+
+def tokens(text):
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word):
+    """pg_trgm style trigrams of a word padded with two leading blanks and
+    one trailing blank."""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """Prefix index answering /search/suggest from memory, with trigram
+    spelling correction of query words.
+
+    Built from one query on first use (or from the gunicorn master before
+    the workers fork) and kept current by the write handlers of this
+    process. Other processes' writes are picked up by a background rebuild
+    once the index is older than SUGGEST_MAX_AGE seconds.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._rebuilding = False
+        self._pending = []
+        # (kind, id) -> entry
+        self._entries = {}
+        # sorted (lowercased name, kind, id)
+        self._names = []
+        # sorted (word, kind, id) for every word of name, city and state
+        self._tokens = []
+        # word -> number of entries using it, and trigram -> words
+        self._words = {}
+        self._word_trigrams = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SUGGEST_LIMIT", 10)
+        app.config.setdefault("SUGGEST_MAX_LIMIT", 50)
+        app.config.setdefault("SUGGEST_MAX_AGE", 300)
+        self.app = app
+
+    # ------------------------------------------------------------------------
+    # Building and updates.
+    # ------------------------------------------------------------------------
+
+    def _rows(self):
+        # straight from the primary engine: the build may run inside a request
+        # whose session must not be touched
+        query = union_all(
+            select([literal("venue"), Venue.id, Venue.name, Venue.city, Venue.state]),
+            select(
+                [literal("artist"), Artist.id, Artist.name, Artist.city, Artist.state]
+            ),
+        )
+        return db.get_engine(self.app).execute(query).fetchall()
+
+    def build(self):
+        """Load every venue and artist and swap the new index in."""
+        with self._build_lock:
+            with self._lock:
+                self._rebuilding = True
+                self._pending = []
+            try:
+                fresh = SuggestIndex()
+                for kind, entity_id, name, city, state in self._rows():
+                    fresh._add(kind, entity_id, name, city, state, insert=list.append)
+                fresh._names.sort()
+                fresh._tokens.sort()
+                with self._lock:
+                    # writes made by this process while the rows were loading
+                    for update in self._pending:
+                        fresh._apply(*update)
+                    self._entries = fresh._entries
+                    self._names = fresh._names
+                    self._tokens = fresh._tokens
+                    self._words = fresh._words
+                    self._word_trigrams = fresh._word_trigrams
+                    self._built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+                    self._pending = []
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            with self._build_lock:
+                built = self._built_at is not None
+            if not built:
+                self.build()
+            return
+        age = time.monotonic() - self._built_at
+        if age > self.app.config["SUGGEST_MAX_AGE"] and not self._build_lock.locked():
+            threading.Thread(target=self.build, daemon=True).start()
+
+    def update(self, kind, entity_id, name, city, state):
+        """Add or replace the entry of a venue/artist after a committed write."""
+        self._update((kind, entity_id, name, city, state))
+
+    def remove(self, kind, entity_id):
+        self._update((kind, entity_id, None, None, None))
+
+    def _update(self, update):
+        with self._lock:
+            if self._rebuilding:
+                self._pending.append(update)
+            self._apply(*update)
+
+    def _apply(self, kind, entity_id, name, city, state):
+        self._remove((kind, entity_id))
+        if name is not None:
+            self._add(kind, entity_id, name, city, state)
+
+    def _add(self, kind, entity_id, name, city, state, insert=bisect.insort):
+        words = sorted(set(tokens(f"{name} {city} {state}")))
+        self._entries[(kind, entity_id)] = {
+            "type": kind,
+            "id": entity_id,
+            "name": name,
+            "city": city,
+            "state": state,
+            "words": words,
+            # " word word ...": a query word prefixes one of the words if
+            # " " + query word is a substring
+            "text": " " + " ".join(words),
+        }
+        insert(self._names, (name.lower(), kind, entity_id))
+        for word in words:
+            insert(self._tokens, (word, kind, entity_id))
+            if word not in self._words:
+                self._words[word] = 0
+                for gram in trigrams(word):
+                    self._word_trigrams.setdefault(gram, set()).add(word)
+            self._words[word] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        kind, entity_id = key
+        _discard(self._names, (entry["name"].lower(), kind, entity_id))
+        for word in entry["words"]:
+            _discard(self._tokens, (word, kind, entity_id))
+            self._words[word] -= 1
+            if not self._words[word]:
+                del self._words[word]
+                for gram in trigrams(word):
+                    self._word_trigrams[gram].discard(word)
+                    if not self._word_trigrams[gram]:
+                        del self._word_trigrams[gram]
+
+    # ------------------------------------------------------------------------
+    # Lookups.
+    # ------------------------------------------------------------------------
+
+    def suggest(self, query, kind=None, limit=10):
+        """Up to `limit` entries matching `query`: names starting with it
+        first, then entries with a word starting with every query word, then
+        the same with misspelt query words replaced by the closest known
+        word."""
+        self._ensure_fresh()
+        prefix = " ".join(query.lower().split())
+        words = tokens(query)
+        if not words:
+            return []
+
+        with self._lock:
+            found = {}
+            self._name_prefix(prefix, kind, limit, found)
+            if len(found) < limit:
+                self._word_prefix(words, kind, limit, found)
+            if len(found) < limit:
+                corrected = [
+                    word if self._is_prefix(word) else self._closest_word(word)
+                    for word in words
+                ]
+                if None not in corrected and corrected != words:
+                    self._word_prefix(corrected, kind, limit, found)
+            return [
+                {
+                    field: entry[field]
+                    for field in ("type", "id", "name", "city", "state")
+                }
+                for entry in found.values()
+            ]
+
+    def _wanted(self, key, kind, found):
+        return key not in found and (kind is None or key[0] == kind)
+
+    def _name_prefix(self, prefix, kind, limit, found):
+        index = bisect.bisect_left(self._names, (prefix,))
+        for name, entry_kind, entity_id in self._names[index : index + MAX_SCAN]:
+            if len(found) == limit or not name.startswith(prefix):
+                return
+            key = (entry_kind, entity_id)
+            if self._wanted(key, kind, found):
+                found[key] = self._entries[key]
+
+    def _word_range(self, word):
+        return (
+            bisect.bisect_left(self._tokens, (word,)),
+            bisect.bisect_left(self._tokens, (word + "\uffff",)),
+        )
+
+    def _is_prefix(self, word):
+        start, end = self._word_range(word)
+        return start < end
+
+    def _word_prefix(self, words, kind, limit, found):
+        # scan the narrowest word range, check the other words per entry
+        ranges = {word: self._word_range(word) for word in words}
+        driver = min(ranges, key=lambda word: ranges[word][1] - ranges[word][0])
+        others = [f" {word}" for word in ranges if word != driver]
+        start, end = ranges[driver]
+        for _, entry_kind, entity_id in self._tokens[
+            start : min(end, start + MAX_SCAN)
+        ]:
+            key = (entry_kind, entity_id)
+            if not self._wanted(key, kind, found):
+                continue
+            entry = self._entries[key]
+            if all(word in entry["text"] for word in others):
+                found[key] = entry
+                if len(found) == limit:
+                    return
+
+    def _closest_word(self, word):
+        """The known word most similar to `word`, None below the threshold."""
+        if len(word) < 3:
+            return None
+        wanted = trigrams(word)
+        postings = sorted(
+            (
+                self._word_trigrams[gram]
+                for gram in wanted
+                if gram in self._word_trigrams
+            ),
+            key=len,
+        )
+        # a word sharing `needed` trigrams appears in one of the rarest postings
+        needed = math.ceil(len(wanted) * SIMILARITY_THRESHOLD)
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for candidate in set().union(*postings[: len(postings) - needed + 1]):
+            grams = trigrams(candidate)
+            score = len(wanted & grams) / len(wanted | grams)
+            if score > best_score or (
+                score == best_score
+                and best is not None
+                and self._words[candidate] > self._words[best]
+            ):
+                best, best_score = candidate, score
+        return best
+
+
+def _discard(items, item):
+    index = bisect.bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timedelta
+
+# the app reads its profile when imported
+os.environ["FYYUR_CONFIG"] = "testing"
+
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import exc, text
+
+from app import app as flask_app
+from models import db, Artist, Show, Venue, recompute_upcoming_shows_counts
+from partitions import ensure_partitions
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+# shows start an hour apart from this moment on, so no venue or artist is
+# double-booked however many are seeded
+FIRST_SHOW = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(
+    days=7
+)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The TEST_DATABASE_URL database, emptied and migrated once per run;
+    the tests needing it are skipped when it cannot be reached."""
+    with flask_app.app_context():
+        try:
+            db.session.execute(text("SELECT 1"))
+        except exc.OperationalError as error:
+            pytest.skip(f"TEST_DATABASE_URL is not reachable: {error.orig}")
+        db.session.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        db.session.commit()
+        upgrade(directory=MIGRATIONS)
+    return db
+
+
+@pytest.fixture
+def app(database):
+    with flask_app.app_context():
+        db.session.execute(
+            text(
+                'TRUNCATE "show", show_summary, venue, artist, import_checkpoint '
+                "RESTART IDENTITY"
+            )
+        )
+        db.session.commit()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def seed_catalog(num_shows, num_venues=5, num_artists=5):
+    """Add venues, artists and `num_shows` half-hour shows, after the shows
+    already there."""
+    start = FIRST_SHOW + timedelta(hours=Show.query.count())
+    start_times = [start + timedelta(hours=index) for index in range(num_shows)]
+    ensure_partitions(start_times)
+
+    venues = [
+        Venue(
+            name=f"Venue {index}",
+            city="San Francisco" if index % 2 else "New York",
+            state="CA" if index % 2 else "NY",
+            address=f"{index} Main Street",
+            phone="326-123-5000",
+            genres=["Jazz"],
+        )
+        for index in range(num_venues)
+    ]
+    artists = [
+        Artist(
+            name=f"Artist {index}",
+            city="San Francisco",
+            state="CA",
+            phone="326-123-5000",
+            genres=["Jazz"],
+        )
+        for index in range(num_artists)
+    ]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+    db.session.add_all(
+        Show(
+            venue_id=venues[index % num_venues].id,
+            artist_id=artists[index % num_artists].id,
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=30),
+        )
+        for index, start_time in enumerate(start_times)
+    )
+    db.session.commit()
+    recompute_upcoming_shows_counts()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+@pytest.fixture
+def seed(app):
+    return seed_catalog
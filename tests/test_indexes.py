@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+from models import db, Venue, filter_catalog
+
+
+def explain(statement, parameters):
+    """Text plan of `statement`, with sequential scans priced out: the test
+    catalog is small enough for PostgreSQL to prefer them otherwise."""
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET enable_seqscan = off")
+        cursor.execute("EXPLAIN " + statement, parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def route_statements(client, path):
+    """(statement, parameters) of every SQL statement a GET of `path` runs."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert client.get(path).status_code == 200
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return statements
+
+
+def keyset_plans(client, path):
+    # the pages of shows, ordered on the keyset columns
+    plans = [
+        explain(statement, parameters)
+        for statement, parameters in route_statements(client, path)
+        if "ORDER BY show.start_time" in statement
+    ]
+    assert plans, f"no keyset query of show on {path}"
+    return plans
+
+
+@pytest.mark.parametrize(
+    "path, index",
+    [
+        ("/venues/1", "venue_id_start_time"),
+        ("/artists/1", "artist_id_start_time"),
+        ("/shows", "start_time_id"),
+    ],
+)
+def test_show_keyset_queries_use_indexes(client, seed, path, index):
+    # every partition has its own copy of an ix_show_* index, named
+    # show_pYYYY_MM_<columns>_idx; with many venues and artists their shows
+    # are a small part of the table, as in production
+    seed(500, num_venues=50, num_artists=50)
+    for plan in keyset_plans(client, path):
+        assert index in plan, plan
+        assert "Seq Scan on show" not in plan, plan
+
+
+def test_venue_state_city_filter_uses_index(app, seed):
+    seed(10, num_venues=50)
+    query = filter_catalog(
+        db.session.query(Venue.id), Venue, state="CA", city="San Francisco"
+    )
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    plan = explain(str(compiled), compiled.params)
+    assert "ix_venue_state_city" in plan, plan
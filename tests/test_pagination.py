@@ -0,0 +1,46 @@
+import pytest
+
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize(
+    "path, key",
+    [
+        ("/api/v1/venues", ["Venue 0", 1]),
+        ("/api/v1/shows", ["2030-01-01T20:00:00", 1]),
+    ],
+)
+def test_cursor_matching_the_keyset_is_accepted(client, path, key):
+    assert (
+        client.get(path, query_string={"after": encode_cursor(key)}).status_code == 200
+    )
+
+
+@pytest.mark.parametrize(
+    "path, key",
+    [
+        ("/api/v1/venues", ["Venue 0", "1"]),
+        ("/api/v1/venues", [1, 1]),
+        ("/api/v1/venues", ["Venue 0", True]),
+        ("/api/v1/venues", ["Venue 0", None]),
+        ("/api/v1/shows", [20300101, 1]),
+        ("/api/v1/shows", ["tomorrow", 1]),
+        ("/api/v1/shows", ["2030-01-01T20:00:00"]),
+    ],
+)
+def test_cursor_of_the_wrong_types_is_rejected(client, path, key):
+    assert (
+        client.get(path, query_string={"after": encode_cursor(key)}).status_code == 400
+    )
+
+
+def test_search_pages_by_similarity_and_id(client, seed):
+    # venues 1 and 10-14, several of them tied on similarity
+    seed(0, num_venues=15)
+    path, ids = "/api/v1/search?type=venues&q=venue%201&per_page=2", []
+    while path:
+        body = client.get(path).get_json()
+        ids += [venue["id"] for venue in body["data"]]
+        path = body["next_url"]
+
+    assert sorted(ids) == [2] + list(range(11, 16))
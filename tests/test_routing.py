@@ -0,0 +1,93 @@
+import pytest
+from flask_sqlalchemy import get_state
+from sqlalchemy import event, text
+
+from models import db, Venue
+from routing import PIN_COOKIE
+
+
+@pytest.fixture
+def replica(app):
+    """A replica_0 bind on the test database, through its own engine; yields
+    the list of "primary"/"replica" targets of the statements run."""
+    binds, replicas = app.config["SQLALCHEMY_BINDS"], app.config["DATABASE_REPLICAS"]
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica_0": app.config["SQLALCHEMY_DATABASE_URI"]
+    }
+    app.config["DATABASE_REPLICAS"] = ["replica_0"]
+    engines = {
+        "primary": db.get_engine(app),
+        "replica": db.get_engine(app, bind="replica_0"),
+    }
+    targets = []
+    listeners = {
+        name: lambda *args, name=name: targets.append(name) for name in engines
+    }
+    for name, engine in engines.items():
+        event.listen(engine, "before_cursor_execute", listeners[name])
+    try:
+        yield targets
+    finally:
+        for name, engine in engines.items():
+            event.remove(engine, "before_cursor_execute", listeners[name])
+        db.session.remove()
+        engines["replica"].dispose()
+        get_state(app).connectors.pop("replica_0", None)
+        app.config["SQLALCHEMY_BINDS"] = binds
+        app.config["DATABASE_REPLICAS"] = replicas
+
+
+def test_get_reads_from_the_replica(client, seed, replica):
+    seed(10)
+    replica.clear()
+    response = client.get("/shows")
+    assert response.status_code == 200
+    assert replica and set(replica) == {"replica"}
+    assert PIN_COOKIE not in response.headers.get("Set-Cookie", "")
+
+
+@pytest.mark.parametrize("path", ["/venues/search", "/artists/search"])
+def test_read_only_post_reads_from_the_replica(client, seed, replica, path):
+    seed(10)
+    replica.clear()
+    assert client.post(path, data={"search_term": "1"}).status_code == 200
+    assert replica and set(replica) == {"replica"}
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        lambda: db.session.execute(text("UPDATE venue SET name = name")),
+        lambda: (
+            db.session.add(
+                Venue(
+                    name="New", city="Austin", state="TX", address="1 Main", phone="1"
+                )
+            ),
+            db.session.flush(),
+        ),
+    ],
+    ids=["dml", "flush"],
+)
+def test_write_sends_the_rest_of_the_request_to_the_primary(app, replica, write):
+    with app.test_request_context("/venues"):
+        app.preprocess_request()
+        db.session.query(Venue.id).all()
+        write()
+        db.session.query(Venue.id).all()
+        response = app.process_response(app.response_class())
+        db.session.rollback()
+
+    assert replica[0] == "replica"
+    assert replica[-1] == "primary"
+    assert replica.index("primary") > 0
+    assert "replica" not in replica[replica.index("primary") :]
+    assert response.headers["Set-Cookie"].startswith(PIN_COOKIE + "=")
+
+
+def test_pin_cookie_sends_reads_to_the_primary(client, seed, replica):
+    seed(10)
+    replica.clear()
+    client.set_cookie(PIN_COOKIE, "1")
+    assert client.get("/shows").status_code == 200
+    assert replica and set(replica) == {"primary"}
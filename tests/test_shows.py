@@ -0,0 +1,19 @@
+import re
+
+QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def statement_count(client, path):
+    """SQL statements run by a GET of `path`, from its Server-Timing header."""
+    response = client.get(path)
+    assert response.status_code == 200
+    return int(QUERIES.search(response.headers["Server-Timing"]).group(1))
+
+
+def test_shows_statement_count_does_not_grow_with_shows(client, seed):
+    # more shows than fit on one page either way
+    seed(60)
+    statements = statement_count(client, "/shows")
+
+    seed(540)
+    assert statement_count(client, "/shows") == statements